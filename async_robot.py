@@ -0,0 +1,206 @@
+"""
+asyncio API of the robot: motions are coroutines and sensors are async streams, so
+independent steps of the mission can overlap, e.g. moving the color arm during a turn:
+
+    async def mission():
+        robot = AsyncRobot()
+        await robot.start()
+        await asyncio.gather(robot.turn(90), robot.arm.move_to_front())
+        await robot.drive(30)
+        async for color in robot.colors():
+            ...
+
+It drives the components of a Robot (and so the utils.brick drivers), whose sensors are
+sampled by its periodic scheduler. Brick calls are short, so the coroutines make them
+directly; they only yield to the event loop while waiting.
+"""
+
+from utils import clock
+from components.gyro_sensor import GyroSensor
+from components.color_sensing_system import ColorSensingSystem
+from components.odometry import Odometry
+from components.turn_engine import TurnEngine
+from robot import Robot
+
+
+async def sleep(seconds):
+    "asyncio.sleep on the clock of the robot (see utils.clock), real or virtual."
+    await clock.sleep_async(seconds)
+
+
+class AsyncColorArm:
+    "The motor that moves the color sensor, as awaitable motions."
+    POLL_INTERVAL = 0.02 # seconds
+
+    def __init__(self, color_sensing_system):
+        self.color_sensing_system = color_sensing_system
+        self.motor = color_sensing_system.motor
+
+    async def move_to(self, position):
+        "Move the arm to the motor position, and return once it is there (or after Motor.move_to's timeout)."
+        move = self.motor.move_to(position)
+        while not move.done():
+            await sleep(AsyncColorArm.POLL_INTERVAL)
+        if not move.result():
+            print(f"Color arm did not reach {position}")
+        return move.result()
+
+    async def move_to_front(self):
+        reached = await self.move_to(ColorSensingSystem.FRONT_POSITION)
+        self.color_sensing_system.is_in_front = True
+        return reached
+
+    async def move_to_right_side(self):
+        reached = await self.move_to(0)
+        self.color_sensing_system.is_in_front = False
+        return reached
+
+
+class AsyncRobot:
+    """
+    Awaitable motions and sensor streams of a Robot. Every motion returns once it is done
+    and can be run concurrently with the motions of the other motors.
+    """
+    def __init__(self, robot=None):
+        self.robot = robot if robot is not None else Robot()
+        self.drive_system = self.robot.drive
+        self.gyro_sensor = self.robot.gyro_sensor
+        self.odometry = self.robot.odometry
+        self.turn_engine = self.robot.turn_engine
+        self.arm = AsyncColorArm(self.robot.color_sensing_system)
+
+    async def start(self):
+        "Start sampling the sensors, like Robot.main does before driving."
+        self.robot.task_scheduler.start()
+        self.robot.start_emergency_monitoring()
+        self.robot.color_sensing_system.start_detecting_color()
+        self.gyro_sensor.start_monitoring_orientation()
+        self.odometry.start()
+        # wait for the first samples
+        while self.gyro_sensor.orientation is None or self.gyro_sensor.sample_count == 0:
+            await sleep(1 / GyroSensor.SAMPLING_RATE)
+
+    async def stop(self):
+        self.robot.stop_moving()
+        self.odometry.stop()
+        self.robot.color_sensing_system.stop_detecting_color()
+        self.gyro_sensor.stop_monitoring_orientation()
+        self.robot.task_scheduler.stop()
+
+    def check_emergency(self):
+        if self.robot.emergency_flag.is_set():
+            self.robot.emergency_stop()
+
+    async def orientations(self):
+        "Async stream of the gyro orientations, one per new sample."
+        last_sample = None
+        while True:
+            sample_count = self.gyro_sensor.sample_count
+            if sample_count != last_sample:
+                last_sample = sample_count
+                yield self.gyro_sensor.orientation
+            await sleep(1 / GyroSensor.SAMPLING_RATE)
+
+    async def colors(self):
+        "Async stream of the detected colors, at the sampling rate of the color sensor."
+        color_sensing_system = self.robot.color_sensing_system
+        while True:
+            with color_sensing_system.color_lock:
+                color = color_sensing_system.most_recent_color
+            yield color
+            await sleep(1 / ColorSensingSystem.SAMPLING_RATE)
+
+    async def poses(self):
+        "Async stream of the odometry poses, at the rate of the odometry."
+        while True:
+            yield self.odometry.pose
+            await sleep(1 / Odometry.RATE)
+
+    async def wait_for_event(self, *names, timeout=None):
+        """
+        Wait for the next color event with one of these names (see COLOR_TRANSITIONS), and
+        return it (a TimestampedEvent). Returns None on timeout.
+        """
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        with self.robot.color_sensing_system.events.subscribe(*names) as events:
+            while True:
+                event = events.poll()
+                if event is not None:
+                    return event
+                self.check_emergency()
+                if deadline is not None and clock.monotonic() > deadline:
+                    return None
+                await sleep(1 / ColorSensingSystem.SAMPLING_RATE)
+
+    async def wait_for_flag(self, flag, timeout=None):
+        "Wait until a threading.Event is set. Returns False on timeout."
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        while not flag.is_set():
+            self.check_emergency()
+            if deadline is not None and clock.monotonic() > deadline:
+                return False
+            await sleep(1 / ColorSensingSystem.SAMPLING_RATE)
+        return True
+
+    async def turn_to(self, orientation, timeout=TurnEngine.TIMEOUT):
+        "Profiled turn to the gyro orientation (see TurnEngine). Returns whether it was reached."
+        start = clock.monotonic()
+        reached = False
+        async for current in self.orientations():
+            self.check_emergency()
+            elapsed = clock.monotonic() - start
+            if elapsed > timeout:
+                print("Turn timed out")
+                break
+            if current is None:
+                continue
+            command = self.turn_engine.command_for(orientation - current, self.gyro_sensor.rate, elapsed)
+            if command is None:
+                reached = True
+                break
+            self.drive_system.set_power(*command)
+        self.drive_system.stop()
+        return reached
+
+    async def turn(self, angle, timeout=TurnEngine.TIMEOUT):
+        """
+        Turn by angle degrees (clockwise positive) from the current orientation. Like
+        turn_to, it waits out the missing gyro samples, until the timeout.
+        """
+        start = clock.monotonic()
+        async for current in self.orientations():
+            if current is not None:
+                break
+            self.check_emergency()
+            if clock.monotonic() - start > timeout:
+                print("Turn timed out: no gyro orientation")
+                return False
+        return await self.turn_to(current + angle, timeout - (clock.monotonic() - start))
+
+    async def drive(self, distance, left_power=Robot.FORWARD_MOVEMENT_POWER_LEFT,
+                    right_power=Robot.FORWARD_MOVEMENT_POWER_RIGHT, timeout=None):
+        """
+        Drive distance cm and stop. Forward, the hallway controller keeps the robot on its
+        current orientation; backward (a negative distance), the wheels run at -left_power
+        and -right_power. Returns whether the distance was reached before the timeout.
+        """
+        start = self.odometry.pose.odometer
+        if distance >= 0:
+            self.robot.hallway_controller.start(heading=self.gyro_sensor.orientation)
+        else:
+            self.drive_system.set_power(-left_power, -right_power)
+        reached = False
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        async for pose in self.poses():
+            self.check_emergency()
+            if abs(pose.odometer - start) >= abs(distance):
+                reached = True
+                break
+            if deadline is not None and clock.monotonic() > deadline:
+                print(f"Did not drive {distance} cm")
+                break
+        self.robot.stop_moving()
+        return reached
+
+    async def stop_moving(self):
+        self.robot.stop_moving()
@@ -0,0 +1,89 @@
+"""
+Calibrate the color sensor: capture labelled RGB samples and fit the color model that
+ColorSensingSystem loads at startup (see components.color_model).
+
+Live, for each color named, put the sensor over that color and press Enter; move the
+robot a little over it while the samples are taken, to capture its variations:
+
+    python3 calibrate_colors.py green yellow orange red black white grey blue
+
+From recorded traces (run_circuit.py --record) of the sensor over a single color each:
+
+    python3 calibrate_colors.py --trace green=green.trace --trace red=red.trace
+"""
+
+from components.color_model import ColorModel, ColorModelError
+from components.color_sensing_system import DEFAULT_COLOR_MODEL_PATH
+from utils import clock
+from utils.brick import PORTS, EV3ColorSensor, wait_ready_sensors
+from utils.trace import METHOD_CODES, RecordFlag, TraceReader
+import argparse
+import sys
+
+
+def capture_samples(sensor, count, rate):
+    "Read count RGB samples from the EV3ColorSensor, at rate Hz. Failed reads are skipped."
+    samples = []
+    while len(samples) < count:
+        rgb = sensor.get_rgb()
+        if None not in rgb:
+            samples.append(rgb)
+        clock.sleep(1 / rate)
+    return samples
+
+
+def trace_samples(path, sensor_port):
+    "The RGB samples read from the color sensor on sensor_port (1 to 4) in a trace file."
+    port = PORTS[str(sensor_port)]
+    reader = TraceReader(path)
+    samples = []
+    for record in reader:
+        if record.method == METHOD_CODES["get_sensor"] and record.port == port \
+                and record.flags & RecordFlag.LIST and not record.flags & RecordFlag.ERROR \
+                and len(record.values) >= 3:
+            samples.append(list(record.values[:3]))
+    reader.close()
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fit the color model of the color sensor.")
+    parser.add_argument("colors", nargs="*", help="colors to capture live, one after the other")
+    parser.add_argument("--trace", action="append", default=[], metavar="COLOR=TRACE",
+                        help="take the samples of a color from a recorded trace")
+    parser.add_argument("--port", type=int, default=3, help="port of the color sensor (default: 3)")
+    parser.add_argument("--samples", type=int, default=100, help="samples captured per color (default: 100)")
+    parser.add_argument("--rate", type=float, default=20, help="capture rate in Hz (default: 20)")
+    parser.add_argument("--out", default=DEFAULT_COLOR_MODEL_PATH, help="model file (default: color_model.json)")
+    args = parser.parse_args()
+    if not args.colors and not args.trace:
+        parser.error("name the colors to capture, or give --trace")
+
+    samples_by_color = {}
+    for spec in args.trace:
+        color, _, path = spec.partition("=")
+        if not path:
+            parser.error(f"--trace {spec}: expected COLOR=TRACE")
+        samples_by_color.setdefault(color, []).extend(trace_samples(path, args.port))
+        print(f"{color}: {len(samples_by_color[color])} samples from {path}")
+    if args.colors:
+        sensor = EV3ColorSensor(args.port)
+        wait_ready_sensors()
+        for color in args.colors:
+            input(f"Put the color sensor over {color} and press Enter")
+            samples_by_color.setdefault(color, []).extend(capture_samples(sensor, args.samples, args.rate))
+            print(f"{color}: {len(samples_by_color[color])} samples")
+
+    try:
+        model = ColorModel.fit(samples_by_color)
+    except ColorModelError as err:
+        sys.exit(f"Cannot fit the color model: {err}")
+    for color in model.classes:
+        print(f"{color.name}: mean {[round(v) for v in color.mean]}, "
+              f"std {[round(color.covariance[i][i] ** 0.5, 1) for i in range(3)]}")
+    model.save(args.out)
+    print(f"Color model written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+Color classification through a lookup table: the RGB cube is quantized to BITS bits per
+channel, and the color of the center of every cell is computed once, so classifying a
+sample is a single table index. The color of a cell is the nearest reference color, or
+the most likely color of a ColorModel (see components.color_model).
+"""
+
+from array import array
+
+
+class ReferenceColors(dict):
+    """
+    The mean RGB of each named color, as a dict of name: (r, g, b). Every change bumps
+    version, so the classifiers built from it know when to rebuild their table. The
+    values are stored as tuples: replace an entry to change it.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__()
+        self.version = 0
+        self.update(*args, **kwargs)
+
+    def __setitem__(self, name, rgb):
+        r, g, b = rgb
+        super().__setitem__(name, (r, g, b))
+        self.version += 1
+
+    def __delitem__(self, name):
+        super().__delitem__(name)
+        self.version += 1
+
+    def update(self, *args, **kwargs):
+        for name, rgb in dict(*args, **kwargs).items():
+            self[name] = rgb
+
+    def setdefault(self, name, rgb=None):
+        if name not in self:
+            self[name] = rgb
+        return self[name]
+
+    def pop(self, *args):
+        self.version += 1
+        return super().pop(*args)
+
+    def popitem(self):
+        self.version += 1
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self.version += 1
+
+
+class ColorClassifier:
+    """
+    Classifies raw RGB samples as the nearest (Euclidean) reference color, or with a
+    ColorModel as its most likely color, with a table of (2 ** BITS) ** 3 bytes.
+    Channel values from MAX_VALUE up fall in the last cell.
+    """
+    BITS = 5 # per channel
+    MAX_VALUE = 512 # exclusive, a power of two
+
+    def __init__(self, references: ReferenceColors, bits=BITS, max_value=MAX_VALUE, model=None):
+        self.references = references
+        self.model = model
+        self.bits = bits
+        self.max_value = max_value
+        self.shift = max_value.bit_length() - 1 - bits
+        self.names = []
+        self.table = b""
+        self.version = None
+        self.rebuild()
+
+    def set_model(self, model):
+        "Classify with the ColorModel from now on, or with the reference colors if None."
+        self.model = model
+        self.rebuild()
+
+    def rebuild(self):
+        "Recompute the table from the model, or from the reference colors."
+        if self.model is not None:
+            self.table = self._model_table(self.model).tobytes()
+            self.names = self.model.names()
+            self.version = self.references.version
+            return
+        names = list(self.references)
+        means = list(self.references.values())
+        if not means:
+            raise ValueError("no reference colors to classify with")
+        cells = 1 << self.bits
+        centers = self.cell_centers()
+        # squared distance along each channel, from every cell center to every reference
+        channel_distances = [[[(center - mean[channel]) ** 2 for mean in means] for center in centers]
+                             for channel in range(3)]
+        references = range(len(means))
+        table = array("B", bytes(cells ** 3))
+        index = 0
+        for dr in channel_distances[0]:
+            for dg in channel_distances[1]:
+                drg = [dr[i] + dg[i] for i in references]
+                for db in channel_distances[2]:
+                    nearest = 0
+                    min_distance = drg[0] + db[0]
+                    for i in references:
+                        distance = drg[i] + db[i]
+                        if distance < min_distance:
+                            nearest = i
+                            min_distance = distance
+                    table[index] = nearest
+                    index += 1
+        self.names = names
+        self.table = table.tobytes()
+        self.version = self.references.version
+
+    def cell_centers(self):
+        cell_size = self.max_value / (1 << self.bits)
+        return [(cell + 0.5) * cell_size for cell in range(1 << self.bits)]
+
+    def _model_table(self, model):
+        # the score of a color (see ColorClass.score) is a quadratic form in the distance
+        # (dr, dg, db) to its mean, expanded so the inner loop is a few operations per color
+        colors = model.classes
+        centers = self.cell_centers()
+        indices = range(len(colors))
+        inverses = [color.inverse for color in colors]
+        distances = [[[center - color.mean[channel] for color in colors] for center in centers]
+                     for channel in range(3)]
+        table = array("B", bytes(len(centers) ** 3))
+        index = 0
+        for dr in distances[0]:
+            red = [inverses[i][0][0] * dr[i] * dr[i] + colors[i].log_determinant for i in indices]
+            for dg in distances[1]:
+                red_green = [red[i] + inverses[i][1][1] * dg[i] * dg[i] + 2 * inverses[i][0][1] * dr[i] * dg[i]
+                             for i in indices]
+                blue_factor = [2 * (inverses[i][0][2] * dr[i] + inverses[i][1][2] * dg[i]) for i in indices]
+                for db in distances[2]:
+                    nearest = 0
+                    min_score = float("inf")
+                    for i in indices:
+                        score = red_green[i] + (inverses[i][2][2] * db[i] + blue_factor[i]) * db[i]
+                        if score < min_score:
+                            nearest = i
+                            min_score = score
+                    table[index] = nearest
+                    index += 1
+        return table
+
+    def classify(self, rgb):
+        """
+        Return the name of the color of the cell of the sample, or None for an invalid one:
+        the most likely color under the ColorModel if there is one, else the nearest
+        reference color. It is the color of the center of the cell, so near a boundary
+        between two colors it only approximates the color of the sample itself.
+        """
+        if self.model is None and self.version != self.references.version:
+            self.rebuild()
+        r, g, b = rgb
+        if r is None or g is None or b is None:
+            return None
+        bits, shift, last = self.bits, self.shift, (1 << self.bits) - 1
+        index = (min(max(int(r), 0) >> shift, last) << (2 * bits)) \
+            | (min(max(int(g), 0) >> shift, last) << bits) \
+            | min(max(int(b), 0) >> shift, last)
+        return self.names[self.table[index]]
@@ -0,0 +1,57 @@
+class ColorFilter:
+    """
+    Debounces the stream of classified colors with a ring buffer of the last window
+    samples: the filtered color only changes to a color once it is votes of the samples
+    in the window, and stays until another color is. With votes a majority of the window
+    it is a majority vote; more votes add hysteresis. window=1, votes=1 does not filter.
+
+    A color that appears and leaves the window again without being accepted is counted
+    as a rejected spurious transition.
+    """
+    def __init__(self, window=5, votes=3):
+        self.accepted = 0
+        self.rejected = 0
+        self.resize(window, votes)
+        self.color = None # filtered
+
+    def add(self, color):
+        "Add a classified color and return the filtered color. None (no color) is ignored."
+        if color is None:
+            return self.color
+        oldest = self.samples[self.index]
+        self.samples[self.index] = color
+        self.index = (self.index + 1) % self.window
+        if oldest is not None:
+            self.counts[oldest] -= 1
+            if self.counts[oldest] == 0:
+                del self.counts[oldest]
+                if oldest in self.candidates:
+                    self.candidates.discard(oldest)
+                    self.rejected += 1
+        self.counts[color] = self.counts.get(color, 0) + 1
+        if color != self.color:
+            if self.counts[color] >= self.votes:
+                self.color = color
+                self.candidates.discard(color)
+                self.accepted += 1
+            else:
+                self.candidates.add(color)
+        return self.color
+
+    def resize(self, window, votes):
+        "Vote on the last window samples from now on. The window restarts empty; the filtered color is kept."
+        if not 1 <= votes <= window:
+            raise ValueError(f"votes must be between 1 and the window ({window}), not {votes}")
+        self.window = window
+        self.votes = votes
+        self.samples = [None] * window
+        self.index = 0 # where the next sample goes
+        self.counts = {}
+        self.candidates = set() # colors in the window that were never accepted
+
+    def reset(self):
+        self.samples = [None] * self.window
+        self.index = 0
+        self.counts = {}
+        self.color = None
+        self.candidates = set()
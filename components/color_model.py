@@ -0,0 +1,108 @@
+"""
+Statistical model of the colors seen by the color sensor, fitted by calibrate_colors.py
+from labelled samples: each color is a Gaussian of the raw RGB values, with its mean and
+covariance. The model is saved as JSON:
+
+    {"version": 1, "classes": {"green": {"mean": [r, g, b], "covariance": [[...], [...], [...]],
+                                         "samples": 200}, ...}}
+"""
+
+import json
+import math
+
+MIN_SAMPLES = 10 # per color, to fit a covariance
+MIN_VARIANCE = 4.0 # added to the variances, so a color that never varied is not singular
+
+
+class ColorModelError(ValueError):
+    "Raised for a model file or samples that cannot be used."
+
+
+class ColorClass:
+    "The Gaussian of one color, with what the classifier needs precomputed."
+    __slots__ = ("name", "mean", "covariance", "samples", "inverse", "log_determinant")
+
+    def __init__(self, name, mean, covariance, samples=0):
+        self.name = name
+        self.mean = [float(v) for v in mean]
+        self.covariance = [[float(v) for v in row] for row in covariance]
+        self.samples = samples
+        if len(self.mean) != 3 or len(self.covariance) != 3 or any(len(row) != 3 for row in self.covariance):
+            raise ColorModelError(f"{name}: the mean must have 3 values and the covariance 3 rows of 3")
+        regularized = [[value + (MIN_VARIANCE if i == j else 0.0) for j, value in enumerate(row)]
+                       for i, row in enumerate(self.covariance)]
+        determinant, self.inverse = _invert(regularized)
+        if determinant <= 0:
+            raise ColorModelError(f"{name}: the covariance is not positive definite")
+        self.log_determinant = math.log(determinant)
+
+    def score(self, rgb):
+        "Squared Mahalanobis distance of rgb plus the log determinant: lower is more likely."
+        d = [rgb[i] - self.mean[i] for i in range(3)]
+        inverse = self.inverse
+        return sum(d[i] * inverse[i][j] * d[j] for i in range(3) for j in range(3)) + self.log_determinant
+
+
+class ColorModel:
+    def __init__(self, classes):
+        self.classes = list(classes)
+        if not self.classes:
+            raise ColorModelError("the model has no colors")
+
+    @staticmethod
+    def fit(samples_by_color):
+        "Fit the model of the {color: [(r, g, b), ...]} samples."
+        classes = []
+        for name, samples in samples_by_color.items():
+            samples = [[float(v) for v in sample[:3]] for sample in samples]
+            if len(samples) < MIN_SAMPLES:
+                raise ColorModelError(f"{name}: {len(samples)} samples, at least {MIN_SAMPLES} are needed")
+            count = len(samples)
+            mean = [sum(sample[i] for sample in samples) / count for i in range(3)]
+            covariance = [[sum((sample[i] - mean[i]) * (sample[j] - mean[j]) for sample in samples) / (count - 1)
+                           for j in range(3)] for i in range(3)]
+            classes.append(ColorClass(name, mean, covariance, count))
+        return ColorModel(classes)
+
+    @staticmethod
+    def load(path):
+        with open(path) as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as err:
+                raise ColorModelError(f"{path} is not valid JSON: {err}") from err
+        if data.get("version") != 1:
+            raise ColorModelError(f"{path}: unsupported color model version {data.get('version')!r}")
+        try:
+            return ColorModel([ColorClass(name, fields["mean"], fields["covariance"], fields.get("samples", 0))
+                               for name, fields in data.get("classes", {}).items()])
+        except (KeyError, TypeError) as err:
+            raise ColorModelError(f"{path}: malformed color: {err!r}") from err
+
+    def save(self, path):
+        classes = {color.name: {"mean": [round(v, 2) for v in color.mean],
+                                "covariance": [[round(v, 2) for v in row] for row in color.covariance],
+                                "samples": color.samples}
+                   for color in self.classes}
+        with open(path, "w") as file:
+            json.dump({"version": 1, "classes": classes}, file, indent=1)
+            file.write("\n")
+
+    def names(self):
+        return [color.name for color in self.classes]
+
+    def classify(self, rgb):
+        "The most likely color of the sample (without the lookup table of ColorClassifier)."
+        return min(self.classes, key=lambda color: color.score(rgb)).name
+
+
+def _invert(matrix):
+    "Return (determinant, inverse) of a 3x3 matrix; the inverse is None when singular."
+    (a, b, c), (d, e, f), (g, h, i) = matrix
+    cofactors = [[e * i - f * h, c * h - b * i, b * f - c * e],
+                 [f * g - d * i, a * i - c * g, c * d - a * f],
+                 [d * h - e * g, b * g - a * h, a * e - b * d]]
+    determinant = a * cofactors[0][0] + b * cofactors[1][0] + c * cofactors[2][0]
+    if determinant == 0:
+        return determinant, None
+    return determinant, [[value / determinant for value in row] for row in cofactors]
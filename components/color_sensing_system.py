@@ -1,10 +1,18 @@
+import os
 import threading
-import time
-import math
-from utils.brick import EV3ColorSensor, Motor
+from utils import clock
+from concurrent.futures import Future
+from utils.brick import EV3ColorSensor, Motor, wait_for_move
+from utils.events import ANY, EventBus, TransitionTable
+from components.color_classifier import ColorClassifier, ReferenceColors
+from components.color_model import ColorModel
+from components.color_filter import ColorFilter
+
+# written by calibrate_colors.py; without it the colors are classified with color_data
+DEFAULT_COLOR_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "color_model.json")
 
 # RGB reference data (normalized)
-color_data = {
+color_data = ReferenceColors({
     'orange': [184, 84, 31],
     'yellow': [209, 172, 42],
     'white': [245, 252, 301],
@@ -13,59 +21,124 @@ color_data = {
     'black': [26, 22, 27],
     'blue': [114, 163, 238],
     'grey': [209, 213, 260]
-}
+})
+
+# the event published by each transition between two (filtered) colors; the first rule
+# that matches wins
+COLOR_TRANSITIONS = TransitionTable([
+    ({"white", "grey", "orange", "yellow", "blue", "green"}, {"black"}, "hallway_on_right"),
+    (ANY, {"red"}, "invalid_entrance"),
+    ({"orange"}, {"yellow"}, "valid_entrance"),
+    ({"yellow"}, {"orange"}, "room_exit"),
+    ({"green"}, {"green"}, "valid_sticker"),
+    ({"yellow"}, {"white", "grey"}, "room_end"),
+    ({"orange"}, {"blue"}, "entered_home"),
+])
 
 class   ColorSensingSystem:
     FRONT_POSITION = -90
     ALL_THE_WAY_LEFT_POSITION = -180 #as much as the robot is able to go
+    SAMPLING_RATE = 20 # Hz
+    # sampling rate of each mode (see set_sampling_mode): idle while the robot is
+    # stationary, fast when a junction or a room entrance can come up at any moment
+    SAMPLING_RATES = {"idle": 5, "normal": SAMPLING_RATE, "fast": 100}
+    PRINT_SAMPLES = False # print every RGB reading and color
+    # a color is only acted upon once it is FILTER_VOTES seconds of the last FILTER_WINDOW
+    # seconds of samples (5 and 3 samples at the normal rate); see filter_size
+    FILTER_WINDOW = 0.25 # seconds
+    FILTER_VOTES = 0.15 # seconds
+    # the sensor sends a new RGB reading about this often (seconds): an identical reading
+    # sooner than that is the previous one read again. The sampling report shows the
+    # rate of new readings actually achieved.
+    SENSOR_UPDATE_PERIOD = 0.01
 
-    def __init__(self, sensor_port, motor_port):
+    def __init__(self, sensor_port, motor_port, scheduler=None, model_path=DEFAULT_COLOR_MODEL_PATH):
+        """
+        With a PeriodicScheduler, the colors are detected by a task of the scheduler
+        instead of a thread of its own. The colors are classified with the ColorModel
+        of model_path if the file exists.
+        """
         self.color_sensor = EV3ColorSensor(sensor_port)
         self.motor = Motor(motor_port)
         self.is_in_front = False
         self.most_recent_color = None
         self.prev_color=None
         self.color_sensing_thread = None
+        self.scheduler = scheduler
         self.stop_sensing_flag = threading.Event()
-        self.detect_hallway_on_right_flag = threading.Event()
-        self.detect_invalid_entrance_flag = threading.Event()
-        self.detect_valid_entrance_flag = threading.Event()
-        self.detect_valid_sticker_flag = threading.Event()
-        self.detect_room_exit_flag = threading.Event()
-        self.detect_entered_home_flag = threading.Event()
-        self.detect_room = threading.Event()
-        self.detect_room_end = threading.Event()
+        # the COLOR_TRANSITIONS events, with the time of the sample that completed them
+        # and (previous color, color) as data
+        self.events = EventBus()
         self.color_lock = threading.Lock()
+        self.sample_listeners = [] # called with every detected color, see add_sample_listener
+        model = None
+        if model_path is not None and os.path.exists(model_path):
+            model = ColorModel.load(model_path)
+            print(f"Classifying colors with the model of {model_path}")
+        self.classifier = ColorClassifier(color_data, model=model)
+        self.sampling_mode = "normal"
+        self.sampling_rate = ColorSensingSystem.SAMPLING_RATE
+        self.color_filter = ColorFilter(*ColorSensingSystem.filter_size(self.sampling_rate))
+        self.last_rgb = None
+        self.last_rgb_time = None
+        self.reset_sampling_statistics()
         self.motor.reset_encoder()
         self.motor.set_limits(power=25)
 
-    def move_sensor_to_front(self):
-        """Moves the sensor to the front of the robot when it tries to enter a room."""
-        self.motor.set_position(ColorSensingSystem.FRONT_POSITION)
-        self.motor.wait_is_stopped()
+    def move_sensor_to_front(self, wait=True):
+        """
+        Moves the sensor to the front of the robot when it tries to enter a room.
+        Returns the Future of the move (see Motor.move_to): with wait=False it returns at
+        once, so the arm can move during a turn or an approach and be awaited later.
+        """
         self.is_in_front = True
-        time.sleep(1)
+        return self.move_sensor_to(ColorSensingSystem.FRONT_POSITION, wait)
 
-    def move_sensor_to_right_side(self):
-        """Moves the sensor back to the side of the robot after it leaves a room."""
-        self.motor.set_position(0)
-        self.motor.wait_is_stopped()
+    def move_sensor_to_right_side(self, wait=True):
+        """Moves the sensor back to the side of the robot after it leaves a room. See move_sensor_to_front."""
         self.is_in_front = False
-        time.sleep(1)
+        return self.move_sensor_to(0, wait)
 
-    def move_sensor_side_to_side(self):
-        """Moves sensor side to side for sticker detection"""
-        self.motor.set_position(0)
-        self.motor.wait_is_stopped()
-        time.sleep(1)
+    def move_sensor_side_to_side(self, wait=True):
+        """Moves sensor side to side for sticker detection, then back to the front. See move_sensor_to_front."""
+        self.is_in_front = True
+        return self.move_sensor_through([0, ColorSensingSystem.ALL_THE_WAY_LEFT_POSITION,
+                                         ColorSensingSystem.FRONT_POSITION], wait)
 
-        self.motor.set_position(ColorSensingSystem.ALL_THE_WAY_LEFT_POSITION)
-        self.motor.wait_is_stopped()
-        time.sleep(1)
+    def move_sensor_to(self, position, wait=True, callback=None):
+        """
+        Start moving the sensor to the motor position and return the Future of the move,
+        whose result is whether the position was reached. callback(future) is called once
+        it is done, from the thread that completes it.
+        """
+        move = self.motor.move_to(position)
+        if callback is not None:
+            move.add_done_callback(callback)
+        if wait:
+            wait_for_move(move)
+        return move
+
+    def move_sensor_through(self, positions, wait=True, callback=None):
+        """
+        Move the sensor to each position in turn, and return a Future that is done after
+        the last one (with True), or as soon as one is not reached (with False).
+        """
+        done = Future()
+        done.set_running_or_notify_cancel()
 
-        #Return to front position
-        self.move_sensor_to_front()
+        def next_move(index):
+            if index == len(positions):
+                done.set_result(True)
+                return
+            move = self.motor.move_to(positions[index])
+            move.add_done_callback(lambda move: next_move(index + 1) if move.result() else done.set_result(False))
 
+        if callback is not None:
+            done.add_done_callback(callback)
+        next_move(0)
+        if wait:
+            wait_for_move(done)
+        return done
 
     def detect_color(self):
         """
@@ -73,7 +146,8 @@ class   ColorSensingSystem:
         'Black', 'White', 'Red', 'Green', 'Orange', or 'Unknown'.
         """
         rgb = self.color_sensor.get_rgb()  # returns list [R, G, B]
-        print(f"RGB sensed: {rgb}")
+        if ColorSensingSystem.PRINT_SAMPLES:
+            print(f"RGB sensed: {rgb}")
         return self.detect_color_from_rgb(rgb)
 
 
@@ -85,55 +159,113 @@ class   ColorSensingSystem:
             rgb: tuple of (R, G, B) values
         
         Returns:
-            str: name of the closest matching color
+            str: name of the closest matching color (see ColorClassifier)
         """
-        r, g, b = rgb
-        
-        min_distance = float('inf')
-        closest_color = None
-        
-        # Calculate Euclidean distance to each color
-        for color_name, color_mean in color_data.items():
-            distance = math.sqrt(
-                (r - color_mean[0]) ** 2 +
-                (g - color_mean[1]) ** 2 +
-                (b - color_mean[2]) ** 2
-            )
-            
-            if distance < min_distance:
-                min_distance = distance
-                closest_color = color_name
-        
-        return closest_color
+        return self.classifier.classify(rgb)
     
     def detect_color_loop(self):
         while not self.stop_sensing_flag.is_set():
-            color = self.detect_color()
-            print(color)
-            if color is None:
-                color = self.prev_color
-            with self.color_lock:
-                self.prev_color = self.most_recent_color
-                self.most_recent_color = color
-                if (self.prev_color in ["white","grey", "orange", "yellow", "blue", "green"]) and color == "black":
-                    self.detect_hallway_on_right_flag.set()
-                elif color == "red":
-                    self.detect_invalid_entrance_flag.set()
-                elif self.prev_color == "orange" and color == "yellow":
-                    self.detect_valid_entrance_flag.set()
-                elif self.prev_color=="yellow" and color=="orange":
-                    self.detect_room_exit_flag.set()
-                elif self.prev_color=="green" and color == "green":
-                    self.detect_valid_sticker_flag.set()
-                elif self.prev_color == "yellow" and (color in ["white","grey"]):
-                    self.detect_room_end.set()
-                elif self.prev_color=="orange" and color=="blue":
-                    self.detect_entered_home_flag.set()
+            self.detect_color_step()
+            clock.sleep(1 / self.sampling_rate)
 
+    @staticmethod
+    def filter_size(rate):
+        "The (window, votes) in samples of the ColorFilter at rate Hz: FILTER_WINDOW and FILTER_VOTES seconds."
+        return (max(1, round(ColorSensingSystem.FILTER_WINDOW * rate)),
+                max(1, round(ColorSensingSystem.FILTER_VOTES * rate)))
+
+    def set_sampling_mode(self, mode):
+        """
+        Sample at the rate of the mode ("idle", "normal" or "fast", see SAMPLING_RATES)
+        from now on. The color filter is resized to keep its window in seconds.
+        """
+        if mode == self.sampling_mode:
+            return
+        rate = ColorSensingSystem.SAMPLING_RATES[mode]
+        with self.color_lock:
+            now = clock.monotonic()
+            self.sampling_statistics[self.sampling_mode][0] += now - self.sampling_start
+            self.sampling_start = now
+            self.sampling_mode = mode
+            self.sampling_rate = rate
+            self.color_filter.resize(*ColorSensingSystem.filter_size(rate))
+        if self.scheduler is not None:
+            self.scheduler.set_rate("color", rate)
+
+    def reset_sampling_statistics(self):
+        with self.color_lock:
+            self.sampling_start = clock.monotonic()
+            # by mode: [seconds spent in the mode before sampling_start, readings, new readings]
+            self.sampling_statistics = {mode: [0.0, 0, 0] for mode in ColorSensingSystem.SAMPLING_RATES}
+
+    def achieved_rates(self):
+        "By mode: (seconds in the mode, readings per second, new readings per second)."
+        rates = {}
+        with self.color_lock:
+            current = clock.monotonic() - self.sampling_start
+            for mode, (elapsed, readings, new_readings) in self.sampling_statistics.items():
+                if mode == self.sampling_mode:
+                    elapsed += current
+                if elapsed > 0:
+                    rates[mode] = (elapsed, readings / elapsed, new_readings / elapsed)
+        return rates
+
+    def sampling_report(self):
+        lines = []
+        for mode, (elapsed, rate, new_rate) in self.achieved_rates().items():
+            lines.append(f"Color sampling {mode} at {ColorSensingSystem.SAMPLING_RATES[mode]} Hz for {elapsed:.1f} s: "
+                         f"achieved {rate:.1f} Hz, {new_rate:.1f} Hz of new readings")
+        return "\n".join(lines)
+
+    def detect_color_step(self):
+        """
+        Detect one color and publish the event of the transition it completes, if any (see
+        COLOR_TRANSITIONS). The transitions are taken on the filtered colors (see ColorFilter),
+        so a single spurious sample does not publish an event; the sample listeners get
+        every color as detected.
+        """
+        timestamp = clock.monotonic()
+        rgb = self.color_sensor.get_rgb()
+        with self.color_lock:
+            statistics = self.sampling_statistics[self.sampling_mode]
+            statistics[1] += 1
+            if rgb == self.last_rgb and timestamp - self.last_rgb_time < ColorSensingSystem.SENSOR_UPDATE_PERIOD:
+                # the sensor has no new reading yet: it must not count twice in the filter.
+                # Once one is due, the same values are a new reading of the same color.
+                return
+            self.last_rgb = rgb
+            self.last_rgb_time = timestamp
+            statistics[2] += 1
+        sample = self.detect_color_from_rgb(rgb)
+        if ColorSensingSystem.PRINT_SAMPLES:
+            print(f"RGB sensed: {rgb}, color: {sample}")
+        with self.color_lock:
+            color = self.color_filter.add(sample) # resized by set_sampling_mode
+            self.prev_color = self.most_recent_color
+            self.most_recent_color = color
+        event = COLOR_TRANSITIONS.lookup(self.prev_color, color)
+        if event is not None:
+            self.events.publish(event, timestamp, (self.prev_color, color))
+        if color != self.prev_color:
             print(f"Detected Color: {color}. Previous Color: {self.prev_color}")
-            time.sleep(0.05)
+        if sample is None:
+            return
+        for listener in list(self.sample_listeners):
+            listener(sample)
+
+    def add_sample_listener(self, listener):
+        "Call listener(color) with every color detected, from the color sensing thread or task."
+        self.sample_listeners.append(listener)
+
+    def remove_sample_listener(self, listener):
+        if listener in self.sample_listeners:
+            self.sample_listeners.remove(listener)
 
     def start_detecting_color(self):
+        if self.scheduler is not None:
+            if not self.scheduler.has_task("color"):
+                self.scheduler.add_task("color", self.detect_color_step, self.sampling_rate)
+            return
         if self.color_sensing_thread and self.color_sensing_thread.is_alive():
             return
         self.stop_sensing_flag.clear()
@@ -141,6 +273,8 @@ class   ColorSensingSystem:
         self.color_sensing_thread.start()
     
     def stop_detecting_color(self):
+        if self.scheduler is not None:
+            self.scheduler.remove_task("color")
         self.stop_sensing_flag.set()
         if self.color_sensing_thread and self.color_sensing_thread.is_alive():
             self.color_sensing_thread.join()
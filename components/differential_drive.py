@@ -0,0 +1,37 @@
+from utils.brick import Motor, MotorGroup
+
+class DifferentialDrive:
+    """
+    The left and right wheels, commanded together: both powers (or speeds) are written
+    to the brick in one transaction, so the wheels never run on a half-applied command.
+    """
+    def __init__(self, left_port, right_port):
+        self.left_motor = Motor(left_port)
+        self.right_motor = Motor(right_port)
+        self.wheels = MotorGroup(self.left_motor, self.right_motor)
+
+    def set_power(self, left_power, right_power, force=False):
+        self.wheels.set_power(left_power, right_power, force=force)
+
+    def set_dps(self, left_dps, right_dps, force=False):
+        self.wheels.set_dps(left_dps, right_dps, force=force)
+
+    def stop(self):
+        self.set_power(0, 0)
+
+    def float_wheels(self):
+        self.set_power(-128, -128)
+
+    def get_encoders(self):
+        "Return the (left, right) encoder positions, read in one pass."
+        left, right = self.wheels.get_statuses()
+        return left[2], right[2]
+
+    def get_speeds(self):
+        "Return the (left, right) wheel speeds in degrees per second, read in one pass."
+        left, right = self.wheels.get_statuses()
+        return left[3], right[3]
+
+    def reset_encoders(self):
+        self.left_motor.reset_encoder()
+        self.right_motor.reset_encoder()
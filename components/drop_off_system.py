@@ -1,36 +1,117 @@
 from utils.brick import Motor
-import time
+from utils import clock
+
+
+class Magazine:
+    """
+    The stack of packages, as slots from the bottom: each slot is loaded, delivered or
+    jammed, and has the travel of the pusher (degrees) and its power limit to push it out.
+    """
+    # (push angle, push power) of the slots from the bottom; the slots above use the last one
+    # the bottom package is pushed less far and slower, with the whole stack on top of it
+    SLOT_PUSHES = [(80, 8), (180, 12)]
+
+    def __init__(self, package_count=2, slot_pushes=None):
+        pushes = Magazine.SLOT_PUSHES if slot_pushes is None else slot_pushes
+        self.pushes = [pushes[min(slot, len(pushes) - 1)] for slot in range(package_count)]
+        self.states = ["loaded"] * package_count
+
+    def next_slot(self):
+        "The lowest loaded slot, which the pusher pushes next, or None when empty."
+        for slot, state in enumerate(self.states):
+            if state == "loaded":
+                return slot
+        return None
+
+    def push_for(self, slot):
+        "(angle, power) of the push of the slot."
+        return self.pushes[slot]
+
+    def mark_delivered(self, slot):
+        self.states[slot] = "delivered"
+
+    def mark_jammed(self, slot):
+        self.states[slot] = "jammed"
+
+    def remaining(self):
+        return self.states.count("loaded")
+
+    def is_empty(self):
+        return self.remaining() == 0
+
 
 class DropOffSystem:
-    def __init__(self, motor_port):
+    """
+    Pushes the lowest package off the stack with a position-controlled push and retract,
+    so the next one falls in place. Each stroke ends as soon as the encoder is at its
+    target, or when the pusher stalls.
+    """
+    POSITION_TOLERANCE = 4 # degrees
+    RETRACT_POWER = 20
+    STALL_DPS = 5 # slower than this, away from the target, the pusher is not moving
+    STALL_PROGRESS = 2 # degrees: the encoder moving this much is progress, whatever the speed
+    STALL_TIME = 0.3 # seconds stalled before giving up the stroke
+    STROKE_TIMEOUT = 3 # seconds
+    POLL_INTERVAL = 0.02 # seconds
+
+    def __init__(self, motor_port, package_count=2):
         self.motor = Motor(motor_port)
-        
+        self.magazine = Magazine(package_count)
+
+    def run_to(self, target, power):
+        """
+        Move the pusher to the encoder target at power and return once it is there (True),
+        or once it stalls (its encoder neither turning nor moving for STALL_TIME) or times out
+        (False). The motor is left holding the position.
+        """
+        self.motor.set_limits(power=power)
+        self.motor.set_position(target)
+        start = clock.monotonic()
+        stalled_since = None
+        progress_position = None # where the encoder last made progress
+        while True:
+            _, _, position, speed = self.motor.get_status()
+            now = clock.monotonic()
+            if position is not None:
+                if abs(position - target) <= DropOffSystem.POSITION_TOLERANCE:
+                    return True
+                # the status flags say nothing about a stall: under position control the
+                # overloaded flag is set whenever the motor is away from its target
+                moving = abs(speed) >= DropOffSystem.STALL_DPS
+                if progress_position is None or abs(position - progress_position) >= DropOffSystem.STALL_PROGRESS:
+                    progress_position = position
+                    moving = True
+                # the motor needs a moment to get going, so only check for stalls after that
+                if moving or now - start < DropOffSystem.STALL_TIME:
+                    stalled_since = None
+                elif stalled_since is None:
+                    stalled_since = now
+                elif now - stalled_since >= DropOffSystem.STALL_TIME:
+                    print(f"Pusher stalled at {position} on the way to {target}")
+                    return False
+            if now - start > DropOffSystem.STROKE_TIMEOUT:
+                print(f"Pusher did not reach {target}")
+                return False
+            clock.sleep(DropOffSystem.POLL_INTERVAL)
 
-    def deliver_package(self, packages_delivered: int):
+    def deliver_package(self):
         """
-        This sytem will move the small motor in a full circle
-        to drop push the lowest package off the stack and allow the next one to
-        fall in place to then be delivered after.
+        Push the package of the lowest loaded slot off the stack and retract the pusher.
+        Returns whether a package was delivered; a push that stalls marks the slot jammed.
         """
-        #self.motor.set_limits(dps=90)
+        slot = self.magazine.next_slot()
+        if slot is None:
+            print("No package left to deliver")
+            return False
+        angle, power = self.magazine.push_for(slot)
+        print(f"Delivering the package of slot {slot}")
         self.motor.reset_encoder() # sets the curr position to 0
-        print(self.motor.get_position())
-        print(f"packages delivered: {packages_delivered}")
-        if packages_delivered == 0:
-            self.motor.set_power(8)
-            time.sleep(1)
-            print(self.motor.get_position())
-            self.motor.set_power(0)
-            time.sleep(0.25)
-            self.motor.set_power(-8)
-            time.sleep(1)
-            self.motor.set_power(0)
+        pushed = self.run_to(angle, power)
+        self.run_to(0, DropOffSystem.RETRACT_POWER)
+        self.motor.set_power(0)
+        self.motor.set_limits()
+        if pushed:
+            self.magazine.mark_delivered(slot)
         else:
-            self.motor.set_power(12)
-            time.sleep(1.5)
-            print(self.motor.get_position())
-            self.motor.set_power(0)
-            time.sleep(0.25)
-            self.motor.set_power(-12)
-            time.sleep(1.5)
-            self.motor.set_power(0)
+            self.magazine.mark_jammed(slot)
+        return pushed
@@ -1,20 +1,32 @@
-import time
+from utils import clock
 from utils.brick import EV3GyroSensor, wait_ready_sensors
 import threading
 
 class GyroSensor:
-    THRESHOLD_FOR_READJUST = 5
-    def __init__(self, port):
-        self.sensor = EV3GyroSensor(port)
+    SAMPLING_RATE = 100 # Hz
+    def __init__(self, port, scheduler=None):
+        """
+        With a PeriodicScheduler, the orientation is sampled by a task of the scheduler
+        instead of a thread of its own.
+        """
+        self.sensor = EV3GyroSensor(port, mode=EV3GyroSensor.Mode.BOTH)
         self.orientation = 0
+        self.rate = 0 # degrees per second, read together with the orientation
+        self.sample_count = 0 # number of samples read by the monitoring thread
+        self.resets = 0 # number of reset_orientation calls, to discard the samples read before one
         self.orientation_lock = threading.Lock()
+        # notified by the monitoring thread on every new orientation sample
+        self.orientation_changed = threading.Condition(self.orientation_lock)
         self.monitor_orientation_thread = None
+        self.scheduler = scheduler
         self.stop_orientation_monitoring_flag = threading.Event()
-        self.readjust_robot_flag = threading.Event()
-        self.check_if_moving_straight_on_path = True
         self.reset_orientation()
     
     def start_monitoring_orientation(self):
+        if self.scheduler is not None:
+            if not self.scheduler.has_task("gyro"):
+                self.scheduler.add_task("gyro", self.update_orientation, GyroSensor.SAMPLING_RATE)
+            return
         if self.monitor_orientation_thread and self.monitor_orientation_thread.is_alive():
             return
         self.stop_orientation_monitoring_flag.clear()
@@ -22,49 +34,58 @@ class GyroSensor:
         self.monitor_orientation_thread.start()
 
     def stop_monitoring_orientation(self):
+        if self.scheduler is not None:
+            self.scheduler.remove_task("gyro")
         self.stop_orientation_monitoring_flag.set()
         if self.monitor_orientation_thread and self.monitor_orientation_thread.is_alive():
             self.monitor_orientation_thread.join()
     
     def get_orientation(self):
-        orientation = self.sensor.get_abs_measure()
-        print(f"Robot orientation: {orientation}")
+        measure = self.sensor.get_zeroed_measure()
+        if measure is None:
+            return None
+        orientation, self.rate = measure
         return orientation
     
     def monitor_orientation_loop(self):
         while not self.stop_orientation_monitoring_flag.is_set():
-            with self.orientation_lock:
-                self.orientation = self.get_orientation()
-            if self.orientation is None:
-                time.sleep(0.01)
-                continue
-            if (self.orientation is not None and (self.orientation > GyroSensor.THRESHOLD_FOR_READJUST
-            or self.orientation < -GyroSensor.THRESHOLD_FOR_READJUST)
-            and self.check_if_moving_straight_on_path
-            ):
-                print(f"readjustment needed, the orientation is: {self.orientation}")
-                self.readjust_robot_flag.set()
-            time.sleep(0.01)
+            self.update_orientation()
+            clock.sleep(1 / GyroSensor.SAMPLING_RATE)
+
+    def update_orientation(self):
+        "Read one orientation sample and notify the waiters (one step of the monitoring)."
+        # read outside the lock, so the waiters are never blocked by the sensor; a sample
+        # read before a reset_orientation is relative to the old 0, so it is dropped
+        with self.orientation_lock:
+            resets = self.resets
+        orientation = self.get_orientation()
+        with self.orientation_changed:
+            if resets != self.resets:
+                return
+            self.orientation = orientation
+            self.sample_count += 1
+            self.orientation_changed.notify_all()
+
+    def wait_for_next_sample(self, timeout=None):
+        "Block until the monitoring thread reads a new sample. Returns False on timeout."
+        with self.orientation_changed:
+            sample_count = self.sample_count
+            return clock.wait_for(self.orientation_changed, lambda: self.sample_count != sample_count, timeout)
 
-    def reset_orientation(self):
+    def reset_orientation(self, orientation=None):
         #this should be done when the robot is turning into some room some
+        # the sensor stays in "both" mode and the monitoring keeps running (it is started
+        # if it was not), the current angle just becomes the new 0
+        # after a turn, pass its target orientation: it becomes the 0 and the orientation
+        # keeps what the turn missed, so the errors of the turns do not add up
         print("Readjusting the gyro orientation to 0")
-        
-        self.stop_orientation_monitoring_flag.set()
-        if self.monitor_orientation_thread and self.monitor_orientation_thread.is_alive():
-            self.monitor_orientation_thread.join()
-        
-        self.sensor.set_mode(EV3GyroSensor.Mode.DPS)
-        time.sleep(0.01)
-        self.sensor.set_mode(EV3GyroSensor.Mode.ABS)
-        time.sleep(0.01)
-
-        self.stop_orientation_monitoring_flag.clear()
+        with self.orientation_changed:
+            self.sensor.rezero(orientation)
+            if orientation is None or self.orientation is None:
+                self.orientation = 0
+            else:
+                self.orientation -= orientation
+            self.resets += 1
+            self.orientation_changed.notify_all()
         self.start_monitoring_orientation()
-
-        with self.orientation_lock:
-            self.orientation=0
-
         print("Gyro reset complete")
-
-
@@ -0,0 +1,130 @@
+from utils import clock
+import threading
+
+class PIDController:
+    "A PID controller with a clamped integral (anti-windup)."
+    def __init__(self, kp, ki=0.0, kd=0.0, integral_limit=float("inf")):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.integral_limit = integral_limit
+        self.reset()
+
+    def reset(self):
+        self.integral = 0.0
+        self.last_error = None
+
+    def update(self, error, dt, derivative=None):
+        """
+        Return the control output for this error, dt seconds after the previous update.
+        derivative is the rate of change of the error when it is measured directly
+        (e.g. the gyro rate), otherwise it is estimated from the previous error.
+        """
+        self.integral += error * dt
+        self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral))
+        if derivative is None:
+            derivative = 0.0 if self.last_error is None or dt <= 0 else (error - self.last_error) / dt
+        self.last_error = error
+        return self.kp * error + self.ki * self.integral + self.kd * derivative
+
+
+class HallwayController:
+    """
+    Keeps the robot straight while it drives forward, at a fixed rate: a PID on the gyro
+    heading trims the left and right wheel powers continuously, without stopping.
+
+    With an UltrasonicSensor, the wall distance shifts the target heading, to steer back
+    towards the wanted distance from the wall.
+    """
+    RATE = 20 # Hz
+    KP = 0.6
+    KI = 0.1
+    KD = 0.05
+    MAX_CORRECTION = 8 # power percent
+    WALL_GAIN = 2 # degrees of heading per cm away from the wanted wall distance
+    MAX_WALL_HEADING = 10 # degrees
+
+    def __init__(self, drive, gyro_sensor, left_power, right_power, us_sensor=None,
+                 wall_distance=None, wall_on_right=True, scheduler=None):
+        """
+        With a PeriodicScheduler, the control runs as a task of the scheduler instead of
+        a thread of its own.
+        """
+        self.drive = drive
+        self.gyro_sensor = gyro_sensor
+        self.left_power = left_power
+        self.right_power = right_power
+        self.us_sensor = us_sensor
+        self.wall_distance = wall_distance
+        self.wall_side = 1 if wall_on_right else -1
+        self.pid = PIDController(HallwayController.KP, HallwayController.KI, HallwayController.KD,
+                                 integral_limit=HallwayController.MAX_CORRECTION / HallwayController.KI)
+        self.heading = 0 # gyro orientation to follow
+        self.last_time = None
+        self.scheduler = scheduler
+        self.control_thread = None
+        self.stop_flag = threading.Event()
+
+    def start(self, heading=0):
+        "Drive forward following the gyro orientation heading, until stop()."
+        self.heading = heading
+        if self.is_running():
+            return
+        self.stop_flag.clear()
+        self.pid.reset()
+        self.last_time = None
+        if self.scheduler is not None:
+            self.scheduler.add_task("hallway", self.control_step, HallwayController.RATE)
+            return
+        self.control_thread = threading.Thread(target=self.control_loop, daemon=True)
+        self.control_thread.start()
+
+    def stop(self):
+        self.stop_flag.set()
+        if self.scheduler is not None:
+            # returns once the control step is not running anymore
+            self.scheduler.remove_task("hallway")
+        if self.control_thread and self.control_thread.is_alive() \
+                and self.control_thread is not threading.current_thread():
+            self.control_thread.join()
+
+    def is_running(self):
+        if self.scheduler is not None:
+            return self.scheduler.has_task("hallway")
+        return self.control_thread is not None and self.control_thread.is_alive()
+
+    def target_heading(self):
+        "Heading to follow: straight, or towards the wanted wall distance."
+        if self.us_sensor is None or self.wall_distance is None:
+            return self.heading
+        with self.us_sensor.lock:
+            distance = self.us_sensor.latest_distance
+        if distance == float("inf"):
+            return self.heading
+        # too far from the wall: steer towards it
+        offset = HallwayController.WALL_GAIN * (distance - self.wall_distance) * self.wall_side
+        return self.heading + max(-HallwayController.MAX_WALL_HEADING, min(HallwayController.MAX_WALL_HEADING, offset))
+
+    def control_loop(self):
+        period = 1 / HallwayController.RATE
+        next_time = clock.monotonic()
+        while not self.stop_flag.is_set():
+            self.control_step()
+            next_time += period
+            clock.sleep(max(0, next_time - clock.monotonic()))
+
+    def control_step(self):
+        "Trim the wheel powers from the current heading (one step of the control)."
+        now = clock.monotonic()
+        with self.gyro_sensor.orientation_lock:
+            orientation = self.gyro_sensor.orientation
+            rate = self.gyro_sensor.rate
+        if orientation is None:
+            return
+        dt = 0.0 if self.last_time is None else now - self.last_time
+        self.last_time = now
+        # clockwise is positive: a positive correction turns the robot left
+        correction = -self.pid.update(self.target_heading() - orientation, dt, -rate)
+        correction = max(-HallwayController.MAX_CORRECTION, min(HallwayController.MAX_CORRECTION, correction))
+        if not self.stop_flag.is_set():
+            self.drive.set_power(self.left_power - correction, self.right_power + correction)
@@ -0,0 +1,133 @@
+from collections import deque, namedtuple
+from utils import clock
+import math
+import threading
+
+# x and y in cm from where the odometry started (x forward, y to the left), heading in
+# degrees (clockwise positive, like the gyro), odometer the signed distance driven in cm
+Pose = namedtuple("Pose", ["x", "y", "heading", "odometer", "timestamp"])
+
+
+class Odometry:
+    """
+    Tracks the pose of the robot in the background, at a fixed rate: the distance comes
+    from the wheel encoders and the heading from the gyro (from the encoders if the gyro
+    has no reading).
+
+    The pose is replaced as a whole by the odometry thread, so reading self.pose needs
+    no lock.
+    """
+    RATE = 50 # Hz
+    WHEEL_RADIUS = 2.8 # cm
+    TRACK_WIDTH = 12.0 # cm between the wheels
+    HISTORY = 50 # poses kept, to know where the robot was when an event happened
+
+    def __init__(self, drive, gyro_sensor=None, scheduler=None):
+        """
+        With a PeriodicScheduler, the pose is updated by a task of the scheduler instead
+        of a thread of its own.
+        """
+        self.drive = drive
+        self.gyro_sensor = gyro_sensor
+        self.pose = Pose(0.0, 0.0, 0.0, 0.0, clock.monotonic())
+        self.history = deque([self.pose], maxlen=Odometry.HISTORY)
+        self.last_encoders = None
+        self.gyro_start = None
+        self.scheduler = scheduler
+        self.odometry_thread = None
+        self.stop_flag = threading.Event()
+
+    def start(self):
+        if self.scheduler is not None:
+            if not self.scheduler.has_task("odometry"):
+                self.last_encoders = None
+                self.scheduler.add_task("odometry", self.update_pose, Odometry.RATE)
+            return
+        if self.odometry_thread and self.odometry_thread.is_alive():
+            return
+        self.stop_flag.clear()
+        self.last_encoders = None
+        self.odometry_thread = threading.Thread(target=self.odometry_loop, daemon=True)
+        self.odometry_thread.start()
+
+    def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.remove_task("odometry")
+        self.stop_flag.set()
+        if self.odometry_thread and self.odometry_thread.is_alive():
+            self.odometry_thread.join()
+
+    def get_gyro_heading(self):
+        "Absolute gyro angle, unaffected by GyroSensor.reset_orientation, or None."
+        if self.gyro_sensor is None:
+            return None
+        return self.gyro_sensor.sensor.last_abs_measure
+
+    def odometry_loop(self):
+        period = 1 / Odometry.RATE
+        next_time = clock.monotonic()
+        while not self.stop_flag.is_set():
+            self.update_pose()
+            next_time += period
+            clock.sleep(max(0, next_time - clock.monotonic()))
+
+    def update_pose(self):
+        "Integrate the wheel movement since the previous update (one step of the odometry)."
+        try:
+            encoders = self.drive.get_encoders()
+        except OSError:
+            encoders = None
+        last_encoders = self.last_encoders
+        self.last_encoders = encoders
+        if last_encoders is None or encoders is None:
+            return
+        cm_per_degree = math.radians(1) * Odometry.WHEEL_RADIUS
+        left = (encoders[0] - last_encoders[0]) * cm_per_degree
+        right = (encoders[1] - last_encoders[1]) * cm_per_degree
+        pose = self.pose
+        gyro_heading = self.get_gyro_heading()
+        if gyro_heading is not None and self.gyro_start is None:
+            self.gyro_start = gyro_heading - pose.heading
+        if gyro_heading is not None:
+            heading = gyro_heading - self.gyro_start
+        else:
+            heading = pose.heading + math.degrees((left - right) / Odometry.TRACK_WIDTH)
+        distance = (left + right) / 2
+        # move along the mean heading of the period
+        mean_heading = math.radians((pose.heading + heading) / 2)
+        self.pose = Pose(pose.x + distance * math.cos(mean_heading),
+                         pose.y - distance * math.sin(mean_heading),
+                         heading, pose.odometer + distance, clock.monotonic())
+        self.history.append(self.pose)
+
+    def odometer_at(self, timestamp):
+        """
+        The odometer at the time timestamp (clock.monotonic()), interpolated between the
+        poses of the history; the oldest one if the time is older than the history.
+        """
+        poses = list(self.history)
+        if timestamp >= poses[-1].timestamp:
+            return poses[-1].odometer
+        for index in range(len(poses) - 1, 0, -1):
+            older, newer = poses[index - 1], poses[index]
+            if older.timestamp <= timestamp:
+                fraction = (timestamp - older.timestamp) / (newer.timestamp - older.timestamp)
+                return older.odometer + fraction * (newer.odometer - older.odometer)
+        return poses[0].odometer
+
+    def wait_until_travelled(self, distance, stop_flag=None, timeout=None, since=None):
+        """
+        Block until the robot has driven distance cm (forward or backward) from now, or
+        from the time since (clock.monotonic(), e.g. the timestamp of an event) if given.
+        Stops early if stop_flag (a threading.Event) is set or after timeout seconds.
+        Returns whether the distance was reached.
+        """
+        start = self.pose.odometer if since is None else self.odometer_at(since)
+        deadline = None if timeout is None else clock.monotonic() + timeout
+        while abs(self.pose.odometer - start) < abs(distance):
+            if stop_flag is not None and stop_flag.is_set():
+                return False
+            if deadline is not None and clock.monotonic() > deadline:
+                return False
+            clock.sleep(1 / Odometry.RATE)
+        return True
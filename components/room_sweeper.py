@@ -0,0 +1,118 @@
+from collections import namedtuple
+from utils import clock
+from components.color_sensing_system import ColorSensingSystem
+
+# A detected color, tagged with the arm encoder angle and the odometry pose read with it
+ColorSample = namedtuple("ColorSample", ["color", "arm_angle", "pose", "timestamp"])
+
+
+class RoomSweeper:
+    """
+    Searches a room for the green sticker in a single pass: the color arm swings from
+    side to side without stopping while the robot creeps forward, and every color sample
+    is tagged with the arm angle and the robot pose. The sticker is found in the sample
+    stream as soon as GREEN_SAMPLES consecutive samples are green. The robot then backs
+    up to where that sample was taken, so its arm angle points at the sticker again.
+    """
+    RIGHT_POSITION = 0
+    LEFT_POSITION = ColorSensingSystem.ALL_THE_WAY_LEFT_POSITION
+    ARM_DPS = 120 # speed of the swing
+    ARM_POWER_LIMIT = 25
+    POSITION_TOLERANCE = 5 # degrees, to reverse the swing
+    CREEP_POWER_RIGHT = 8
+    CREEP_POWER_LEFT = CREEP_POWER_RIGHT * 1.25
+    MAX_DISTANCE = 80 # cm driven into the room before giving up
+    GREEN_SAMPLES = 2
+    POLL_INTERVAL = 0.02 # seconds
+    TIMEOUT = 30 # seconds
+    BACK_UP_TIMEOUT = 3 # seconds
+
+    def __init__(self, color_sensing_system, drive, odometry):
+        self.color_sensing_system = color_sensing_system
+        self.arm = color_sensing_system.motor
+        self.drive = drive
+        self.odometry = odometry
+        self.samples = [] # of the last sweep
+
+    def record_sample(self, color):
+        # called by the color sensing thread or task for every color
+        self.samples.append(ColorSample(color, self.arm.get_position(), self.odometry.pose, clock.monotonic()))
+
+    def find_sticker(self, start=0):
+        """
+        Return the sample at the middle of the first run of GREEN_SAMPLES (or more) green
+        samples from index start, or None.
+        """
+        samples = self.samples
+        run_start = None
+        for index in range(start, len(samples)):
+            if samples[index].color == "green":
+                if run_start is None:
+                    run_start = index
+            else:
+                if run_start is not None and index - run_start >= RoomSweeper.GREEN_SAMPLES:
+                    return samples[(run_start + index - 1) // 2]
+                run_start = None
+        if run_start is not None and len(samples) - run_start >= RoomSweeper.GREEN_SAMPLES:
+            return samples[(run_start + len(samples) - 1) // 2]
+        return None
+
+    def back_up_to(self, pose, stop_flag=None):
+        """
+        Stop and drive backward until the odometer is back at the one of pose: the robot
+        kept creeping between that pose and the detection.
+        """
+        self.drive.stop()
+        self.drive.set_power(-RoomSweeper.CREEP_POWER_LEFT, -RoomSweeper.CREEP_POWER_RIGHT)
+        deadline = clock.monotonic() + RoomSweeper.BACK_UP_TIMEOUT
+        while self.odometry.pose.odometer > pose.odometer:
+            if (stop_flag is not None and stop_flag.is_set()) or clock.monotonic() > deadline:
+                break
+            clock.sleep(RoomSweeper.POLL_INTERVAL)
+        self.drive.stop()
+
+    def sweep(self, stop_flag=None):
+        """
+        Sweep the room and return the ColorSample of the sticker, or None if the end of the
+        room (or MAX_DISTANCE) is reached first. The arm is left where it is and the robot
+        is stopped. Stops early if stop_flag (a threading.Event) is set.
+        """
+        self.samples = []
+        with self.color_sensing_system.events.subscribe("room_end") as room_ends:
+            start_odometer = self.odometry.pose.odometer
+            deadline = clock.monotonic() + RoomSweeper.TIMEOUT
+            target = RoomSweeper.LEFT_POSITION
+            self.arm.set_limits(power=RoomSweeper.ARM_POWER_LIMIT, dps=RoomSweeper.ARM_DPS)
+            self.arm.set_position(target)
+            self.drive.set_power(RoomSweeper.CREEP_POWER_LEFT, RoomSweeper.CREEP_POWER_RIGHT)
+            self.color_sensing_system.add_sample_listener(self.record_sample)
+            sticker = None
+            checked = 0
+            try:
+                while not (stop_flag is not None and stop_flag.is_set()):
+                    sticker = self.find_sticker(max(0, checked - RoomSweeper.GREEN_SAMPLES))
+                    checked = len(self.samples)
+                    if sticker is not None:
+                        print(f"Green sticker at arm angle {sticker.arm_angle}")
+                        self.back_up_to(sticker.pose, stop_flag)
+                        break
+                    if room_ends.poll() is not None:
+                        print("Reached the end of the room")
+                        break
+                    if abs(self.odometry.pose.odometer - start_odometer) >= RoomSweeper.MAX_DISTANCE \
+                            or clock.monotonic() > deadline:
+                        print("could not find the green sticker")
+                        break
+                    position = self.arm.get_position()
+                    if position is not None and abs(position - target) <= RoomSweeper.POSITION_TOLERANCE:
+                        # reverse the swing
+                        target = RoomSweeper.RIGHT_POSITION if target == RoomSweeper.LEFT_POSITION \
+                            else RoomSweeper.LEFT_POSITION
+                        self.arm.set_position(target)
+                    clock.sleep(RoomSweeper.POLL_INTERVAL)
+            finally:
+                self.color_sensing_system.remove_sample_listener(self.record_sample)
+                self.drive.stop()
+                self.arm.set_power(0)
+                self.arm.set_limits(power=RoomSweeper.ARM_POWER_LIMIT)
+        return sticker
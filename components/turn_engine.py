@@ -0,0 +1,76 @@
+from utils import clock
+import math
+
+class TurnEngine:
+    """
+    Turns the robot in place to a gyro orientation with a trapezoidal rate profile:
+    it speeds up to MAX_RATE, and brakes when the angle left is the distance it needs to
+    slow down at DECELERATION, so it arrives fast and stops on target.
+
+    The wheel power follows the profile from the gyro rate: a feedforward from the target
+    rate, plus a correction of the measured rate error, so the turn does not depend on
+    the battery level. The gyro monitoring thread must be running.
+    """
+    MAX_RATE = 180 # degrees per second
+    START_RATE = 30 # degrees per second, the profile starts there
+    ACCELERATION = 360 # degrees per second squared
+    DECELERATION = 240 # degrees per second squared
+    RATE_PER_POWER = 4.8 # turning rate in degrees per second for each percent of power
+    RATE_GAIN = 0.05 # power percent per degree per second of rate error
+    MIN_POWER = 6 # below this the wheels do not move the robot
+    MAX_POWER = 50
+    TOLERANCE = 1 # degrees
+    TIMEOUT = 10 # seconds
+
+    def __init__(self, drive, gyro_sensor):
+        self.drive = drive
+        self.gyro_sensor = gyro_sensor
+
+    def target_rate(self, angle_left, elapsed):
+        "Turning rate of the profile, elapsed seconds after the start with angle_left degrees to go."
+        accelerating = TurnEngine.START_RATE + TurnEngine.ACCELERATION * elapsed
+        braking = math.sqrt(2 * TurnEngine.DECELERATION * max(0, angle_left - TurnEngine.TOLERANCE / 2))
+        return min(TurnEngine.MAX_RATE, accelerating, braking)
+
+    def command_for(self, angle_left, rate, elapsed):
+        """
+        Return the (left, right) wheel powers for a turn with angle_left degrees to go
+        (clockwise positive), at the measured rate in degrees per second, elapsed seconds
+        after the start, or None once the turn is within TOLERANCE.
+        """
+        if abs(angle_left) <= TurnEngine.TOLERANCE:
+            return None
+        direction = 1 if angle_left > 0 else -1
+        target_rate = self.target_rate(abs(angle_left), elapsed)
+        power = target_rate / TurnEngine.RATE_PER_POWER + TurnEngine.RATE_GAIN * (target_rate - rate * direction)
+        power = max(TurnEngine.MIN_POWER, min(TurnEngine.MAX_POWER, power))
+        # clockwise: the left wheel forward and the right wheel backward
+        return direction * power, -direction * power
+
+    def turn_to(self, orientation, stop_flag=None, timeout=TIMEOUT):
+        """
+        Turn until the gyro reads the given orientation, on every gyro sample.
+        Stops early if stop_flag (a threading.Event) is set or after timeout seconds.
+        Returns whether the orientation was reached.
+        """
+        # the orientation may predate a reset_orientation (e.g. of the previous turn)
+        self.gyro_sensor.wait_for_next_sample(timeout=0.1)
+        start = clock.monotonic()
+        reached = False
+        while not (stop_flag is not None and stop_flag.is_set()):
+            elapsed = clock.monotonic() - start
+            if elapsed > timeout:
+                print("Turn timed out")
+                break
+            with self.gyro_sensor.orientation_lock:
+                current = self.gyro_sensor.orientation
+                rate = self.gyro_sensor.rate
+            if current is not None:
+                command = self.command_for(orientation - current, rate, elapsed)
+                if command is None:
+                    reached = True
+                    break
+                self.drive.set_power(*command)
+            self.gyro_sensor.wait_for_next_sample(timeout=0.1)
+        self.drive.stop()
+        return reached
@@ -1,5 +1,5 @@
 import threading
-import time
+from utils import clock
 from utils.brick import EV3UltrasonicSensor
 
 class UltrasonicSensor:
@@ -9,7 +9,13 @@ class UltrasonicSensor:
     ACCEPTABLE_DISTANCES = {
         "short": (SHORT_DISTANCE_FROM_WALL-THRESHOLD_DISTANCE, SHORT_DISTANCE_FROM_WALL+THRESHOLD_DISTANCE),
     }
-    def __init__(self, sensor_port: int):
+    SAMPLING_RATE = 2 # Hz
+
+    def __init__(self, sensor_port: int, scheduler=None):
+        """
+        With a PeriodicScheduler, the distance is monitored by a task of the scheduler
+        instead of a thread of its own.
+        """
         self.us_sensor = EV3UltrasonicSensor(sensor_port)
         self.wall_pointed_to = "short"
         self.latest_distance = float('inf')
@@ -17,9 +23,14 @@ class UltrasonicSensor:
         self.lock = threading.Lock()
         self.stop_flag = threading.Event()
         self.monitor_distance_thread = None
+        self.scheduler = scheduler
 
     def start_monitoring_distance(self):
         #allows to monitor the distance in the background
+        if self.scheduler is not None:
+            if not self.scheduler.has_task("ultrasonic"):
+                self.scheduler.add_task("ultrasonic", self.update_distance, UltrasonicSensor.SAMPLING_RATE)
+            return
         if self.monitor_distance_thread and self.monitor_distance_thread.is_alive():
             return
         self.stop_flag.clear()
@@ -27,23 +38,29 @@ class UltrasonicSensor:
         self.monitor_distance_thread.start()
     
     def stop_monitoring_distance(self):
+        if self.scheduler is not None:
+            self.scheduler.remove_task("ultrasonic")
         self.stop_flag.set()
         if self.monitor_distance_thread and self.monitor_distance_thread.is_alive():
             self.monitor_distance_thread.join()
 
     def monitor_loop(self):
         while not self.stop_flag.is_set():
-            distance = self.get_distance()
-            direction = self.check_adjustment(distance, self.wall_pointed_to)
-            with self.lock:
-                self.latest_distance = distance
-                self.latest_readjust_direction = direction
-            print(f"US Sensor Distance: {distance} cm, Adjustment Needed: {direction}")
+            self.update_distance()
             # allows the monitor loop to be interruptible
             for _ in range(5):
                 if self.stop_flag.is_set():
                     return
-                time.sleep(0.1)
+                clock.sleep(0.1)
+
+    def update_distance(self):
+        "Read one distance and the adjustment it needs (one step of the monitoring)."
+        distance = self.get_distance()
+        direction = self.check_adjustment(distance, self.wall_pointed_to)
+        with self.lock:
+            self.latest_distance = distance
+            self.latest_readjust_direction = direction
+        print(f"US Sensor Distance: {distance} cm, Adjustment Needed: {direction}")
 
     def get_distance(self)->float:
         distance = self.us_sensor.get_cm()
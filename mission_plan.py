@@ -0,0 +1,104 @@
+"""
+The route of the mission, loaded from a JSON plan (see mission_plan.json):
+
+    junctions: the kind of each junction on the right of the hallway, in the order the
+               robot meets them
+    actions:   for each kind of junction, the action to take while delivering the
+               packages and while going home
+
+Before the robot moves, the plan is validated and compiled into a transition table with
+one entry per (junction, mode), so each junction event is a single list lookup.
+"""
+
+import json
+import os
+
+DEFAULT_PLAN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "mission_plan.json")
+
+MODES = ("delivering", "going_home")
+# action: whether it ends the mission
+ACTIONS = {
+    "skip": False,
+    "turn": False,
+    "visit_room": False,
+    "enter_home": True,
+}
+
+
+class MissionPlanError(ValueError):
+    "Raised for a plan that cannot be run."
+
+
+class MissionPlan:
+    def __init__(self, junctions, actions):
+        self.junctions = list(junctions)
+        self.actions = {kind: dict(by_mode) for kind, by_mode in actions.items()}
+        self.validate()
+
+    @staticmethod
+    def load(path=DEFAULT_PLAN_PATH):
+        with open(path) as file:
+            try:
+                data = json.load(file)
+            except json.JSONDecodeError as err:
+                raise MissionPlanError(f"{path} is not valid JSON: {err}") from err
+        if data.get("version") != 1:
+            raise MissionPlanError(f"{path}: unsupported plan version {data.get('version')!r}")
+        return MissionPlan(data.get("junctions", []), data.get("actions", {}))
+
+    def validate(self):
+        if not self.junctions:
+            raise MissionPlanError("the plan has no junctions")
+        for index, kind in enumerate(self.junctions):
+            if kind not in self.actions:
+                raise MissionPlanError(f"junction {index} is a {kind!r}, which has no actions")
+        for kind, by_mode in self.actions.items():
+            for mode in MODES:
+                if mode not in by_mode:
+                    raise MissionPlanError(f"no action for a {kind!r} junction while {mode}")
+                if by_mode[mode] not in ACTIONS:
+                    raise MissionPlanError(f"unknown action {by_mode[mode]!r} for a {kind!r} junction")
+        if not any(ACTIONS[self.actions[kind]["going_home"]] for kind in self.junctions):
+            raise MissionPlanError("the robot can never get home: no junction ends the mission")
+
+    def compile(self, handlers):
+        """
+        Return the CompiledMission of this plan, where handlers maps every action name
+        to the function that runs it.
+        """
+        missing = [action for action in ACTIONS if action not in handlers]
+        if missing:
+            raise MissionPlanError(f"no handler for the actions {missing}")
+        transitions = []
+        for index, kind in enumerate(self.junctions):
+            for mode in MODES:
+                action = self.actions[kind][mode]
+                transitions.append(Transition(kind, action, handlers[action], index + 1, ACTIONS[action]))
+        return CompiledMission(transitions, len(self.junctions))
+
+
+class Transition:
+    "What to do at a junction: the action and its handler, and the next junction."
+    __slots__ = ("kind", "action", "handler", "next_junction", "ends_mission")
+
+    def __init__(self, kind, action, handler, next_junction, ends_mission):
+        self.kind = kind
+        self.action = action
+        self.handler = handler
+        self.next_junction = next_junction
+        self.ends_mission = ends_mission
+
+
+class CompiledMission:
+    def __init__(self, transitions, junction_count):
+        self.transitions = transitions  # indexed by junction * len(MODES) + mode
+        self.junction_count = junction_count
+
+    def __len__(self):
+        return self.junction_count
+
+    def transition(self, junction, going_home):
+        "The Transition taken at the junction (index in the plan), or None past the last one."
+        if junction >= self.junction_count:
+            return None
+        return self.transitions[junction * len(MODES) + going_home]
@@ -1,223 +1,197 @@
 import os
+import math
 import re
 import sys
-import time
-from components.wheel import Wheel
+from utils import clock
+from components.differential_drive import DifferentialDrive
+from components.hallway_controller import HallwayController
+from components.turn_engine import TurnEngine
+from components.odometry import Odometry
+from components.room_sweeper import RoomSweeper
 from components.gyro_sensor import GyroSensor
-from components.color_sensing_system import ColorSensingSystem
+from components.color_sensing_system import ColorSensingSystem, DEFAULT_COLOR_MODEL_PATH
 from components.speaker import Speaker
 from components.drop_off_system import DropOffSystem
-from utils.brick import TouchSensor, reset_brick, wait_ready_sensors
+from mission_plan import MissionPlan, DEFAULT_PLAN_PATH
+from utils.periodic_scheduler import PeriodicScheduler
+from utils.brick import (TouchSensor, dump_latency_histograms, latency_histograms_enabled, reset_brick,
+                         start_io_scheduler, wait_for_move, wait_ready_sensors)
 import threading
 
-# This will store what each right turn which we detect means
-RIGHT_TURNS = [ "room",
-                "home_valid",
-                "turn",
-                "room",
-                "home_invalid",
-                "turn",
-                "room",
-                "home_valid",
-                "room",
-                "home_invalid",
-                "turn" ]
-
 class Robot:
     FORWARD_MOVEMENT_POWER_RIGHT=15
     FORWARD_MOVEMENT_POWER_LEFT=FORWARD_MOVEMENT_POWER_RIGHT*1.25
-    POWER_FOR_TURN=15
     EXIT_ROOM_POWER=10
+    PACKAGE_COUNT=2
+
+    # distances driven with the odometry, in cm
+    JUNCTION_OVERSHOOT_DISTANCE = 4 # past the junction color before turning
+    EXIT_ROOM_EXTRA_DISTANCE = 10 # backing up, past the room exit
+    ENTER_HOME_DISTANCE = 15 # into home, past its entrance
+    DISTANCE_TIMEOUT = 5 # seconds, in case the wheels are stuck
+    BRANCH_EXIT_TIMEOUT = 15 # seconds, backing up the whole path from a room to the hallway
+
+    EMERGENCY_CHECK_RATE = 20 # Hz
+    EVENT_WAIT_INTERVAL = 0.05 # seconds between two checks of the emergency flag while waiting for an event
     
-    CHECK_READJUST_TIME_INTERVAL = 0.1
-    def __init__(self):
+    def __init__(self, plan_path=DEFAULT_PLAN_PATH, color_model_path=DEFAULT_COLOR_MODEL_PATH):
+        # every thread talks to the brick through a single I/O thread from now on
+        self.io_scheduler = start_io_scheduler()
+        # the route is checked before anything moves: a bad plan raises a MissionPlanError
+        self.mission = MissionPlan.load(plan_path).compile({
+            "skip": self.skip_junction,
+            "turn": self.turn_at_junction,
+            "visit_room": self.visit_room,
+            "enter_home": self.enter_home,
+        })
+        # and the periodic work of every component runs on a single thread
+        self.task_scheduler = PeriodicScheduler()
         self.right_turns_passed = 0
         self.packages_delivered = 0
-        self.right_wheel = Wheel('B')
-        self.left_wheel = Wheel('C')
-        self.drop_off_system = DropOffSystem('A')
+        self.drive = DifferentialDrive('C', 'B') # left wheel on C, right wheel on B
+        self.drop_off_system = DropOffSystem('A', package_count=Robot.PACKAGE_COUNT)
         self.speaker = Speaker()
-        self.gyro_sensor = GyroSensor(4)
-        self.color_sensing_system = ColorSensingSystem(3, 'D')
+        self.gyro_sensor = GyroSensor(4, scheduler=self.task_scheduler)
+        self.color_sensing_system = ColorSensingSystem(3, 'D', scheduler=self.task_scheduler,
+                                                       model_path=color_model_path)
+        self.turn_engine = TurnEngine(self.drive, self.gyro_sensor)
+        self.odometry = Odometry(self.drive, self.gyro_sensor, scheduler=self.task_scheduler)
+        self.room_sweeper = RoomSweeper(self.color_sensing_system, self.drive, self.odometry)
+        # no ultrasonic sensor on this robot, so the hallway controller follows the gyro only
+        self.hallway_controller = HallwayController(self.drive, self.gyro_sensor,
+                                                    Robot.FORWARD_MOVEMENT_POWER_LEFT,
+                                                    Robot.FORWARD_MOVEMENT_POWER_RIGHT,
+                                                    scheduler=self.task_scheduler)
         self.emergency_touch_sensor = TouchSensor(1)
         self.go_home = False 
-        self.emergency_button_listener_thread = None
+        self.branch_start = self.odometry.pose # where the robot left the hallway for a room
         self.emergency_flag = threading.Event()
-        self.wheel_lock=threading.Lock() # using this to ensure no conflicts with emergency stop and main thread
         wait_ready_sensors()
-        time.sleep(1)  # give some time to stabilize sensors
+        clock.sleep(1)  # give some time to stabilize sensors
 
     def main(self):
+        self.task_scheduler.start()
         self.start_emergency_monitoring()
         self.color_sensing_system.start_detecting_color()
         self.gyro_sensor.start_monitoring_orientation()
+        self.odometry.start()
         self.move_in_hallway() 
         self.stop_moving()
+        self.odometry.stop()
         self.color_sensing_system.stop_detecting_color()
         self.gyro_sensor.stop_monitoring_orientation() 
+        self.task_scheduler.stop()
+        self.print_statistics()
+
+    def print_statistics(self):
+        # what the color filter, the sampling and the event queues did during the run
+        color_filter = self.color_sensing_system.color_filter
+        print(f"Color filter: {color_filter.accepted} colors accepted, {color_filter.rejected} spurious colors rejected")
+        print(self.color_sensing_system.sampling_report())
+        print(self.color_sensing_system.events.report())
 
     def start_emergency_monitoring(self):
-        # a dedicated thread to monitor the emergency button
-        self.emergency_thread = threading.Thread(target=self.monitor_emergency_button, daemon=True)
-        self.emergency_thread.start()
-        print("Emergency monitoring thread started")
+        # checked before every other periodic task
+        self.task_scheduler.add_task("emergency", self.check_emergency_button,
+                                     Robot.EMERGENCY_CHECK_RATE, priority=0)
+        print("Emergency monitoring started")
     
-    def monitor_emergency_button(self):
-        #this runs in its own thread, all other functions should just return if
-        #the button has been pressed
-        while not self.emergency_flag.is_set():
-            if self.emergency_touch_sensor.is_pressed():
-                self.emergency_flag.set()
-                print("EMERGENCY BUTTON PRESSED!")
-                self.emergency_stop()
-                self.emergency_flag.clear()
-                break
-            time.sleep(0.05)
+    def check_emergency_button(self):
+        #all other functions should just return if the button has been pressed
+        if self.emergency_touch_sensor.is_pressed():
+            self.emergency_flag.set()
+            print("EMERGENCY BUTTON PRESSED!")
+            self.task_scheduler.remove_task("emergency")
+            self.emergency_stop()
+            self.emergency_flag.clear()
 
-    def turn_right_90(self, power=POWER_FOR_TURN):
+    def turn_right_90(self):
         print("Turning right")
-        while True:
-            if self.emergency_flag.is_set():
-                self.emergency_stop()
-            with self.gyro_sensor.orientation_lock:
-                current_orientation = self.gyro_sensor.orientation
-            
-            if current_orientation > 88:
-                break
-            with self.wheel_lock:
-                self.left_wheel.spin_wheel_continuously(power)
-                self.right_wheel.spin_wheel_continuously(-power)
-        self.stop_moving()
-        self.gyro_sensor.reset_orientation()
+        self.turn_to(90)
+        self.gyro_sensor.reset_orientation(90)
 
-    def turn_left_90(self, power=POWER_FOR_TURN):
+    def turn_left_90(self):
         print("Turning left")
-        while True:
-            if self.emergency_flag.is_set():
-                self.emergency_stop()
-            with self.gyro_sensor.orientation_lock:
-                current_orientation = self.gyro_sensor.orientation
-            
-            if current_orientation < -88:
-                break
-            with self.wheel_lock:
-                self.left_wheel.spin_wheel_continuously(-power)
-                self.right_wheel.spin_wheel_continuously(power)
-        self.stop_moving()
-        self.gyro_sensor.reset_orientation()
+        self.turn_to(-90)
+        self.gyro_sensor.reset_orientation(-90)
 
-    def readjust_alignment(self):
-        # this would take info from the US sensor to check the distance from
-        #the right wall and readjust if the distance is too large or small
-        readjust_power_increase = 5
-        print("Readjusting")
-        while True:
-            if self.emergency_flag.is_set():
-                self.emergency_stop()
-            with self.gyro_sensor.orientation_lock:
-                current = self.gyro_sensor.orientation
-            
-            if abs(current) <= 1:
-                print("Alignment OK")
-                self.stop_moving()
-                break
-
-            if current>0:
-                with self.wheel_lock:
-                    self.left_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_LEFT)
-                    self.right_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_RIGHT + readjust_power_increase)
-            else:
-                with self.wheel_lock:
-                    self.left_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_LEFT+readjust_power_increase)
-                    self.right_wheel.spin_wheel_continuously(-Robot.FORWARD_MOVEMENT_POWER_RIGHT)
-            time.sleep(Robot.CHECK_READJUST_TIME_INTERVAL)
-        if self.gyro_sensor.readjust_robot_flag.is_set():
-            self.gyro_sensor.readjust_robot_flag.clear()
-        print("Readjustment complete")
+    def turn_to(self, orientation):
+        # profiled turn to the gyro orientation, cut short by the emergency button
+        self.turn_engine.turn_to(orientation, stop_flag=self.emergency_flag)
+        if self.emergency_flag.is_set():
+            self.emergency_stop()
+        self.stop_moving()
 
     def move_in_hallway(self):
-        while True:
-            if self.emergency_flag.is_set():
-                self.emergency_stop()
-            
-            #if self.gyro_sensor.readjust_robot_flag.is_set():
-            #    with self.gyro_sensor.orientation_lock:
-            #        self.readjust_alignment()
-            else:
-                with self.wheel_lock:
-                    self.left_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_LEFT)
-                    self.right_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_RIGHT)
+        with self.color_sensing_system.events.subscribe("hallway_on_right") as junctions:
+            while True:
+                # keeps the robot straight until stop_moving()
+                self.color_sensing_system.set_sampling_mode("fast")
+                self.hallway_controller.start()
+                event = self.wait_for_event(junctions)
 
-            # Turn right on valid intersections and then start moving again
-            if self.color_sensing_system.detect_hallway_on_right_flag.is_set():
-                self.color_sensing_system.detect_hallway_on_right_flag.clear()
+                # Turn right on valid intersections and then start moving again
                 print("Detected path on right")
-                time.sleep(0.5)
+                self.drive_distance(Robot.JUNCTION_OVERSHOOT_DISTANCE, since=event.timestamp)
                 self.stop_moving()
 
-                if self.right_turns_passed >= len(RIGHT_TURNS):
-                    print("No more RIGHT_TURNS entries — ignoring right path")
+                transition = self.mission.transition(self.right_turns_passed, self.go_home)
+                if transition is None:
+                    print("No more junctions in the mission plan — ignoring right path")
                     continue
 
-                turn_detected = RIGHT_TURNS[self.right_turns_passed]
-                print(f"<-----------------this was deetcted: {turn_detected}----------------------->")
-                
-
-                if turn_detected == "home_valid" and self.go_home:
-                    self.gyro_sensor.check_if_moving_straight_on_path = False
-                    self.turn_right_90()
-                    self.gyro_sensor.reset_orientation()
-                    self.gyro_sensor.check_if_moving_straight_on_path = True
-                    self.right_turns_passed += 1
-                    self.head_home_after_turn()
+                print(f"<-----------------this was deetcted: {transition.kind}----------------------->")
+                self.right_turns_passed = transition.next_junction
+                transition.handler()
+                if transition.ends_mission:
                     break
+                # the black lines seen during the maneuver are not junctions of the hallway
+                junctions.clear()
+
+    def skip_junction(self):
+        pass
 
-                elif turn_detected == "home_invalid":
-                    self.right_turns_passed += 1
+    def turn_at_junction(self):
+        self.turn_right_90()
+
+    def visit_room(self):
+        # the arm moves to the front during the turn
+        arm_move = self.color_sensing_system.move_sensor_to_front(wait=False)
+        self.turn_right_90()
+        # where the robot left the hallway, to back up to it after the room
+        self.branch_start = self.odometry.pose
+        self.detected_room_action(arm_move)
+
+    def enter_home(self):
+        arm_move = self.color_sensing_system.move_sensor_to_front(wait=False)
+        self.turn_at_junction()
+        wait_for_move(arm_move)
+        self.head_home_after_turn()
 
-                elif turn_detected == "turn":
-                    self.gyro_sensor.check_if_moving_straight_on_path = False
-                    self.turn_right_90()
-                    self.gyro_sensor.reset_orientation()
-                    self.gyro_sensor.check_if_moving_straight_on_path = True
-                    self.gyro_sensor.reset_orientation()
-                    self.right_turns_passed += 1
-                    
-                elif turn_detected == "room" and not self.go_home:
-                    self.gyro_sensor.check_if_moving_straight_on_path = False
-                    self.turn_right_90()
-                    self.right_turns_passed += 1
-                    self.detected_room_action()
-                    self.gyro_sensor.reset_orientation()
-                    self.gyro_sensor.check_if_moving_straight_on_path = True
-                
     def stop_moving(self):
-        with self.wheel_lock:
-            self.left_wheel.stop_spinning()
-            self.right_wheel.stop_spinning()
+        self.hallway_controller.stop()
+        self.drive.stop()
+        self.color_sensing_system.set_sampling_mode("idle")
     
-    def detected_room_action(self):
+    def detected_room_action(self, arm_move=None):
         """
         this is done after turning right at some room
+        arm_move is the move of the color arm to the front, if it was started already
         """
-        self.color_sensing_system.move_sensor_to_front()
-        time.sleep(0.5)
-        while not self.color_sensing_system.detect_invalid_entrance_flag.is_set() and \
-            not self.color_sensing_system.detect_valid_entrance_flag.is_set():
-            if self.emergency_flag.is_set():
-                return
-            with self.wheel_lock:
-                self.left_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_LEFT)
-                self.right_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_RIGHT)
-            time.sleep(0.05)
+        if arm_move is None:
+            arm_move = self.color_sensing_system.move_sensor_to_front(wait=False)
+        wait_for_move(arm_move)
+        # subscribed once the arm is in front: the colors seen while it moved are ignored
+        with self.color_sensing_system.events.subscribe("valid_entrance", "invalid_entrance") as entrances:
+            self.color_sensing_system.set_sampling_mode("fast")
+            self.drive.set_power(Robot.FORWARD_MOVEMENT_POWER_LEFT, Robot.FORWARD_MOVEMENT_POWER_RIGHT)
+            event = self.wait_for_event(entrances)
         self.stop_moving()
 
-        if self.color_sensing_system.detect_valid_entrance_flag.is_set():
-            self.color_sensing_system.detect_valid_entrance_flag.clear()
+        if event.name == "valid_entrance":
             print("detected valid entrance")
             self.handle_non_meeting_room()
-        elif self.color_sensing_system.detect_invalid_entrance_flag.is_set():
-            self.color_sensing_system.detect_invalid_entrance_flag.clear()
+        else:
             print("detected invalid entrance")
             self.stop_moving()
             self.handle_meeting_room()
@@ -226,113 +200,105 @@ class Robot:
     def handle_non_meeting_room(self):
         position_of_green_sticker = self.sweep_room_for_green_sticker()
         if position_of_green_sticker != float("inf"):
+            # the arm goes back to the side during the rotation
+            arm_move = self.color_sensing_system.move_sensor_to_right_side(wait=False)
             self.rotate_for_delivery(90-position_of_green_sticker)
-            if self.color_sensing_system.is_in_front or self.color_sensing_system.motor.get_position()==self.color_sensing_system.FRONT_POSITION:
-                self.color_sensing_system.move_sensor_to_right_side()
+            wait_for_move(arm_move)
             self.drop_off_package()
             self.rotate_for_delivery(0) # 90 deg for the arm represents 0 for the robot
         self.return_in_hallway_after_delivery()
 
     def sweep_room_for_green_sticker(self)->int:
-            #returns the angle at which the color sensor detects the green sticker
-        for _ in range(10):
-            if self.color_sensing_system.detect_room_end.is_set():
-                return float("inf")
-            if self.color_sensing_system.detect_valid_sticker_flag.is_set():
-                self.color_sensing_system.detect_valid_sticker_flag.clear()
-                self.color_sensing_system.motor.set_power(0)
-                print("detected the green sticker")
-                return self.color_sensing_system.motor.get_position()
-            self.color_sensing_system.move_sensor_side_to_side()
-            time.sleep(0.5)
-            self.move_slightly_forward_for_sweep()
-        print("could not find the green sticker")
-        return float("inf")
+        #returns the arm angle at which the color sensor detected the green sticker
+        # the sweeper is tuned for the normal rate (see RoomSweeper.GREEN_SAMPLES)
+        self.color_sensing_system.set_sampling_mode("normal")
+        sticker = self.room_sweeper.sweep(stop_flag=self.emergency_flag)
+        if self.emergency_flag.is_set():
+            self.emergency_stop()
+        if sticker is None:
+            return float("inf")
+        print("detected the green sticker")
+        return sticker.arm_angle
     
     def rotate_for_delivery(self, target_angle_of_gyro: int):
         print("Rotating the robot for delivery")
-
-        if target_angle_of_gyro > 0: #right
-            left_power = Robot.POWER_FOR_TURN
-            right_power = -Robot.POWER_FOR_TURN
-            done = lambda cur: cur>=target_angle_of_gyro
-            
-        else: #left
-            left_power = -Robot.POWER_FOR_TURN
-            right_power = Robot.POWER_FOR_TURN
-            done = lambda cur: cur<=target_angle_of_gyro
-        
-        while True:
-            with self.gyro_sensor.orientation_lock:
-                current = self.gyro_sensor.orientation
-            
-            if done(current):
-                break
-                
-            with self.wheel_lock:
-                self.left_wheel.spin_wheel_continuously(left_power)
-                self.right_wheel.spin_wheel_continuously(right_power)
-            
-        self.stop_moving()
+        self.turn_to(target_angle_of_gyro)
         
     def return_in_hallway_after_delivery(self):
         self.color_sensing_system.move_sensor_to_right_side()
-        with self.wheel_lock:
-            self.left_wheel.spin_wheel_continuously(-Robot.EXIT_ROOM_POWER)
-            self.right_wheel.spin_wheel_continuously(-Robot.EXIT_ROOM_POWER)
-        while not self.color_sensing_system.detect_room_exit_flag.is_set():
-            time.sleep(0.05)
-        time.sleep(2)
-        self.stop_moving()
+        with self.color_sensing_system.events.subscribe("room_exit") as exits:
+            self.color_sensing_system.set_sampling_mode("fast")
+            self.drive.set_power(-Robot.EXIT_ROOM_POWER, -Robot.EXIT_ROOM_POWER)
+            event = self.wait_for_event(exits)
+        self.drive_distance(Robot.EXIT_ROOM_EXTRA_DISTANCE, since=event.timestamp)
+        self.back_up_to_hallway()
         self.turn_right_90()
         self.turn_right_90()
         self.turn_right_90()
-        self.color_sensing_system.detect_room_exit_flag.clear()
+
+    def back_up_to_hallway(self):
+        # the entrance can be far from the hallway: back up to where the robot left it, so
+        # the color sensor is over the junction lines again once it turns back
+        self.drive.set_power(-Robot.FORWARD_MOVEMENT_POWER_LEFT, -Robot.FORWARD_MOVEMENT_POWER_RIGHT)
+        self.drive_distance(max(0, self.distance_into_branch()), timeout=Robot.BRANCH_EXIT_TIMEOUT)
+        self.stop_moving()
+
+    def distance_into_branch(self):
+        "How far forward (cm) the robot is from branch_start, along the heading it had there."
+        pose, start = self.odometry.pose, self.branch_start
+        heading = math.radians(start.heading)
+        # x forward and y to the left at heading 0, the heading clockwise (see Pose)
+        return (pose.x - start.x) * math.cos(heading) - (pose.y - start.y) * math.sin(heading)
 
     def handle_meeting_room(self):
+        arm_move = self.color_sensing_system.move_sensor_to_right_side(wait=False)
+        self.back_up_to_hallway()
         self.turn_left_90()
-        self.color_sensing_system.move_sensor_to_right_side()
+        wait_for_move(arm_move)
     
     def head_home_after_turn(self):
-        # might need to add some code to be able to readjust if needed since the 
-        # distance is very large
+        # the distance is very large, so the hallway controller keeps the robot straight
         if not self.color_sensing_system.is_in_front:
             self.color_sensing_system.move_sensor_to_front()
 
-        while not self.color_sensing_system.detect_entered_home_flag.is_set():
-
-            if self.gyro_sensor.readjust_robot_flag.is_set():
-                with self.gyro_sensor.orientation_lock:
-                    self.readjust_alignment()
-            else:
-                with self.wheel_lock:
-                    self.left_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_LEFT)
-                    self.right_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_RIGHT)
-            time.sleep(0.05)
-        # exits the loop as soon as the flag is set
-        # let the robot move a little more forward into the room before stopping it
-        time.sleep(2)
+        with self.color_sensing_system.events.subscribe("entered_home") as home:
+            self.color_sensing_system.set_sampling_mode("fast")
+            self.hallway_controller.start()
+            event = self.wait_for_event(home)
+        # let the robot move a little more forward into the room (from where it was
+        # when the color changed) before stopping it
+        self.drive_distance(Robot.ENTER_HOME_DISTANCE, since=event.timestamp)
         self.stop_moving()
-        self.color_sensing_system.detect_entered_home_flag.clear()
         self.speaker.play_mission_complete_tone()
         print("MISSION COMPLETE. ROBOT IS HOME.")
         self.emergency_stop()
             
     def drop_off_package(self):
         self.stop_moving()
-        self.drop_off_system.deliver_package(self.packages_delivered)
-        self.speaker.play_delivery_tone()
-        print("PACKED DROPPED")
-        self.packages_delivered += 1
-        if self.packages_delivered == 2:
+        if self.drop_off_system.deliver_package():
+            self.speaker.play_delivery_tone()
+            print("PACKED DROPPED")
+            self.packages_delivered += 1
+        if self.drop_off_system.magazine.is_empty():
             self.go_home = True
 
-    def move_slightly_forward_for_sweep(self):
-        with self.wheel_lock:
-            self.left_wheel.spin_wheel_continuously(Robot.FORWARD_MOVEMENT_POWER_LEFT)
-            self.right_wheel.rotate_wheel_degrees(Robot.FORWARD_MOVEMENT_POWER_RIGHT)
-        time.sleep(1)
-        self.stop_moving()
+    def wait_for_event(self, events):
+        # the next event of the EventQueue, checking the emergency button meanwhile
+        while True:
+            event = events.get(timeout=Robot.EVENT_WAIT_INTERVAL)
+            if event is not None:
+                return event
+            if self.emergency_flag.is_set():
+                self.emergency_stop()
+
+    def drive_distance(self, distance, since=None, timeout=DISTANCE_TIMEOUT):
+        # keeps the current wheel commands until the odometry has seen distance cm go by
+        # (since the time since, e.g. of an event, if given)
+        if not self.odometry.wait_until_travelled(distance, stop_flag=self.emergency_flag,
+                                                  timeout=timeout, since=since):
+            print(f"Did not drive {distance} cm")
+        if self.emergency_flag.is_set():
+            self.emergency_stop()
         
     def emergency_stop(self):
         self.color_sensing_system.stop_detecting_color()
@@ -341,5 +307,8 @@ class Robot:
         self.color_sensing_system.stop_detecting_color()
         print("EMERGENCY STOP ACTIVATED")
         reset_brick()
+        self.print_statistics()
+        if latency_histograms_enabled():
+            dump_latency_histograms() # os._exit skips the exit handlers
         os._exit(1)
         
\ No newline at end of file
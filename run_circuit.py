@@ -1,12 +1,16 @@
 from robot import Robot
-from utils.brick import reset_brick
+from mission_plan import DEFAULT_PLAN_PATH
+from components.color_sensing_system import DEFAULT_COLOR_MODEL_PATH
+from utils import clock
+from utils.brick import enable_latency_histograms, reset_brick, start_recording, start_replay
+import argparse
 import threading
 import time
 
-def main():
+def main(plan_path=DEFAULT_PLAN_PATH, color_model_path=DEFAULT_COLOR_MODEL_PATH):
     # this function should run the entire circuit
     reset_brick()
-    robot = Robot()
+    robot = Robot(plan_path, color_model_path)
     robot.main()
     #robot.turn_right_90()
     #robot.color_sensing_system.move_sensor_to_front()
@@ -17,9 +21,28 @@ def main():
     
     
 if __name__ == "__main__":
-    
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--plan", default=DEFAULT_PLAN_PATH,
+                        help="mission plan to follow (default: mission_plan.json)")
+    parser.add_argument("--color-model", default=DEFAULT_COLOR_MODEL_PATH,
+                        help="color model written by calibrate_colors.py (default: color_model.json, if it exists)")
+    parser.add_argument("--virtual-time", action="store_true",
+                        help="run faster than real time (only meaningful with the simulated brick)")
+    parser.add_argument("--record", metavar="TRACE", help="record all the brick I/O to this trace file")
+    parser.add_argument("--replay", metavar="TRACE", help="replay the brick I/O recorded in this trace file")
+    parser.add_argument("--latency", action="store_true",
+                        help="print latency histograms of the sensor and motor calls at exit")
+    args = parser.parse_args()
+    if args.virtual_time:
+        clock.set_clock(clock.VirtualClock())
+    if args.record:
+        start_recording(args.record)
+    if args.replay:
+        start_replay(args.replay)
+    if args.latency:
+        enable_latency_histograms()
     try:
-        main()
+        main(args.plan, args.color_model)
         #reset_brick()
     except KeyboardInterrupt:
         reset_brick()
\ No newline at end of file
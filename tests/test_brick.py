@@ -0,0 +1,18 @@
+from utils import brick
+from utils.brick import Motor
+
+
+def test_latency_is_recorded_on_the_port_the_motor_is_set_to():
+    brick.enable_latency_histograms(dump_at_exit=False)
+    brick.reset_latency_histograms()
+    try:
+        motor = Motor("A")
+        motor.set_power(10)
+        motor.set_port("D")
+        motor.set_power(20)
+        counts = {histogram.port: histogram.count() for histogram in brick.get_latency_histograms()
+                  if histogram.method == "Motor.set_power"}
+        assert counts == {"A": 1, "D": 1}
+    finally:
+        brick.disable_latency_histograms()
+        brick.reset_latency_histograms()
@@ -0,0 +1,48 @@
+import random
+
+from components.color_classifier import ColorClassifier, ReferenceColors
+from components.color_sensing_system import color_data
+
+
+def nearest(references, rgb):
+    return min(references, key=lambda name: sum((x - m) ** 2 for x, m in zip(rgb, references[name])))
+
+
+def cell_center(classifier, rgb):
+    centers = classifier.cell_centers()
+    last = len(centers) - 1
+    return [centers[min(max(int(x), 0) >> classifier.shift, last)] for x in rgb]
+
+
+def test_table_matches_the_nearest_color_of_every_cell():
+    references = ReferenceColors(color_data)
+    classifier = ColorClassifier(references, bits=3)
+    for rgb in [(r, g, b) for r in classifier.cell_centers() for g in classifier.cell_centers()
+                for b in classifier.cell_centers()]:
+        assert classifier.classify(rgb) == nearest(references, rgb)
+
+
+def test_samples_get_the_nearest_color_of_their_cell():
+    references = ReferenceColors(color_data)
+    classifier = ColorClassifier(references)
+    samples = random.Random(0)
+    for _ in range(2000):
+        rgb = [samples.randrange(-20, 600) for _ in range(3)]
+        assert classifier.classify(rgb) == nearest(references, cell_center(classifier, rgb))
+    for name, mean in references.items():
+        assert classifier.classify(mean) == name
+
+
+def test_changed_references_rebuild_the_table():
+    references = ReferenceColors({"black": (20, 20, 20), "white": (250, 250, 250)})
+    classifier = ColorClassifier(references)
+    assert classifier.classify((100, 100, 100)) == "black"
+    references["grey"] = (110, 110, 110)
+    assert classifier.classify((100, 100, 100)) == "grey"
+    del references["grey"]
+    assert classifier.classify((100, 100, 100)) == "black"
+
+
+def test_invalid_sample_has_no_color():
+    classifier = ColorClassifier(ReferenceColors(color_data))
+    assert classifier.classify((None, 10, 10)) is None
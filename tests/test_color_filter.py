@@ -0,0 +1,42 @@
+import pytest
+
+from components.color_filter import ColorFilter
+
+
+def feed(color_filter, colors):
+    return [color_filter.add(color) for color in colors]
+
+
+def test_color_is_accepted_once_it_has_the_votes():
+    color_filter = ColorFilter(window=5, votes=3)
+    assert feed(color_filter, ["white", "white", "white"]) == [None, None, "white"]
+    assert feed(color_filter, ["black", "black", "black"]) == ["white", "white", "black"]
+    assert (color_filter.accepted, color_filter.rejected) == (2, 0)
+
+
+def test_glitch_that_leaves_the_window_is_rejected():
+    color_filter = ColorFilter(window=3, votes=2)
+    assert feed(color_filter, ["white", "white", "red", "white", "white", "white"])[-1] == "white"
+    assert (color_filter.accepted, color_filter.rejected) == (1, 1)
+
+
+def test_none_is_ignored():
+    color_filter = ColorFilter(window=3, votes=2)
+    assert feed(color_filter, ["blue", None, "blue"]) == [None, None, "blue"]
+    assert color_filter.counts == {"blue": 2}
+
+
+def test_window_of_one_does_not_filter():
+    color_filter = ColorFilter(window=1, votes=1)
+    assert feed(color_filter, ["white", "red", "white"]) == ["white", "red", "white"]
+    assert (color_filter.accepted, color_filter.rejected) == (3, 0)
+
+
+def test_resize_keeps_the_filtered_color():
+    color_filter = ColorFilter(window=3, votes=2)
+    feed(color_filter, ["green", "green"])
+    color_filter.resize(5, 3)
+    assert feed(color_filter, ["yellow", "yellow"]) == ["green", "green"]
+    assert color_filter.add("yellow") == "yellow"
+    with pytest.raises(ValueError):
+        color_filter.resize(3, 4)
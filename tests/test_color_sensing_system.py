@@ -0,0 +1,79 @@
+import pytest
+
+from components.color_sensing_system import ColorSensingSystem, color_data
+from utils import clock
+
+
+class ManualClock:
+    "A clock that only moves when the test says so."
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def manual_clock():
+    previous = clock.get_clock()
+    manual = ManualClock()
+    clock.set_clock(manual)
+    yield manual
+    clock.set_clock(previous)
+
+
+@pytest.fixture
+def color_sensing_system(manual_clock):
+    system = ColorSensingSystem(3, "D", model_path=None)
+    system.rgb_readings = []
+    system.color_sensor.get_rgb = lambda: system.rgb_readings.pop(0)
+    return system
+
+
+def step(system, rgb, at):
+    clock.get_clock().now = at
+    system.rgb_readings.append(rgb)
+    system.detect_color_step()
+
+
+def test_reading_repeated_before_the_sensor_updates_is_dropped(color_sensing_system):
+    green = list(color_data["green"])
+    step(color_sensing_system, green, 0.0)
+    step(color_sensing_system, green, ColorSensingSystem.SENSOR_UPDATE_PERIOD / 2)
+    _, readings, new_readings = color_sensing_system.sampling_statistics["normal"]
+    assert (readings, new_readings) == (2, 1)
+    assert color_sensing_system.color_filter.counts == {"green": 1}
+
+
+def test_reading_repeated_once_a_new_one_is_due_counts(color_sensing_system):
+    green = list(color_data["green"])
+    for index in range(3):
+        step(color_sensing_system, green, index * ColorSensingSystem.SENSOR_UPDATE_PERIOD * 2)
+    _, readings, new_readings = color_sensing_system.sampling_statistics["normal"]
+    assert (readings, new_readings) == (3, 3)
+    assert color_sensing_system.most_recent_color == "green"
+
+
+def test_filter_window_is_kept_in_seconds(color_sensing_system):
+    for mode, rate in ColorSensingSystem.SAMPLING_RATES.items():
+        color_sensing_system.set_sampling_mode(mode)
+        window, votes = color_sensing_system.color_filter.window, color_sensing_system.color_filter.votes
+        assert (window, votes) == ColorSensingSystem.filter_size(rate)
+    assert ColorSensingSystem.filter_size(ColorSensingSystem.SAMPLING_RATES["fast"]) == (25, 15)
+
+
+def test_sampling_statistics_are_kept_by_mode(color_sensing_system, manual_clock):
+    manual_clock.now = 2.0
+    color_sensing_system.set_sampling_mode("fast")
+    step(color_sensing_system, [1, 2, 3], 3.0)
+    rates = color_sensing_system.achieved_rates()
+    assert rates["normal"] == (2.0, 0.0, 0.0)
+    assert rates["fast"] == (1.0, 1.0, 1.0)
+    assert "idle" not in rates
@@ -0,0 +1,71 @@
+import pytest
+
+from components.drop_off_system import DropOffSystem
+from utils import clock
+
+
+class ManualClock:
+    "A clock that only moves when slept on."
+
+    def __init__(self):
+        self.now = 0.0
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class SlowMotor:
+    """
+    A pusher that moves at dps degrees per second (of the clock) to its target, then stops,
+    with the overloaded flag set until it is there, like a motor under position control.
+    """
+
+    def __init__(self, dps, stop_at=None):
+        self.dps = dps
+        self.stop_at = stop_at # position where it jams, if any
+        self.position = 0.0
+        self.target = 0.0
+        self.last_time = 0.0
+
+    def set_limits(self, power=0, dps=0):
+        pass
+
+    def set_position(self, position):
+        self.target = position
+
+    def get_status(self):
+        now = clock.monotonic()
+        step = self.dps * (now - self.last_time)
+        self.last_time = now
+        end = self.target if self.stop_at is None else min(self.target, self.stop_at)
+        speed = self.dps if self.position < end else 0
+        self.position = min(end, self.position + step)
+        flags = 0x02 if abs(self.target - self.position) > DropOffSystem.POSITION_TOLERANCE else 0
+        return [flags, 0, round(self.position), speed]
+
+
+@pytest.fixture
+def drop_off_system():
+    previous = clock.get_clock()
+    clock.set_clock(ManualClock())
+    system = DropOffSystem("A")
+    yield system
+    clock.set_clock(previous)
+
+
+def test_long_stroke_is_not_taken_for_a_stall(drop_off_system):
+    # 180 degrees at 90 dps is 2 s, far more than STALL_TIME, with the overloaded flag set throughout
+    drop_off_system.motor = SlowMotor(dps=90)
+    assert drop_off_system.run_to(180, 12)
+
+
+def test_jammed_pusher_stalls(drop_off_system):
+    drop_off_system.motor = SlowMotor(dps=90, stop_at=60)
+    assert not drop_off_system.run_to(180, 12)
+    assert clock.monotonic() < DropOffSystem.STROKE_TIMEOUT
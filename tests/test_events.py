@@ -0,0 +1,49 @@
+from utils.events import ANY, EventBus, TransitionTable
+
+
+def test_first_matching_rule_wins():
+    table = TransitionTable([
+        ({"white"}, {"black"}, "hallway_on_right"),
+        (ANY, {"black"}, "black"),
+        ({"black"}, ANY, "left_black"),
+    ])
+    assert table.lookup("white", "black") == "hallway_on_right"
+    assert table.lookup("red", "black") == "black"
+    assert table.lookup("black", "white") == "left_black"
+    assert table.lookup("white", "red") is None
+
+
+def test_transitions_are_memoized():
+    table = TransitionTable([({"white"}, {"black"}, "hallway_on_right")])
+    assert table.lookup("white", "black") == "hallway_on_right"
+    assert table.lookup("white", "red") is None
+    table.rules = [(ANY, ANY, "changed")]
+    assert table.lookup("white", "black") == "hallway_on_right"
+    assert table.lookup("white", "red") is None
+    assert table.lookup("red", "white") == "changed"
+
+
+def test_subscriber_only_gets_its_events():
+    bus = EventBus()
+    bus.publish("room", timestamp=0.0)
+    with bus.subscribe("room", "turn") as queue:
+        bus.publish("room", timestamp=1.0, data="right")
+        bus.publish("home", timestamp=2.0)
+        event = queue.poll()
+        assert (event.name, event.timestamp, event.data) == ("room", 1.0, "right")
+        assert queue.poll() is None
+    bus.publish("room", timestamp=3.0)
+    assert queue.poll() is None
+    assert bus.published == 4
+
+
+def test_full_queue_drops_the_oldest_event():
+    bus = EventBus()
+    queue = bus.subscribe("tick", size=2)
+    other = bus.subscribe("tick", size=2)
+    for timestamp in range(3):
+        bus.publish("tick", timestamp=float(timestamp))
+    assert [queue.poll().timestamp for _ in range(2)] == [1.0, 2.0]
+    assert (queue.dropped, other.dropped) == (1, 1)
+    assert bus.dropped == 2
+    assert bus.report() == "Events: 3 published, 2 dropped by full queues"
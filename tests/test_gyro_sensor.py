@@ -0,0 +1,34 @@
+from components.gyro_sensor import GyroSensor
+
+
+class ManualScheduler:
+    "Holds the tasks without running them: the test steps them itself."
+
+    def __init__(self):
+        self.tasks = {}
+
+    def has_task(self, name):
+        return name in self.tasks
+
+    def add_task(self, name, task, rate, priority=None):
+        self.tasks[name] = task
+
+    def remove_task(self, name):
+        self.tasks.pop(name, None)
+
+
+def test_sample_read_before_a_reset_is_discarded():
+    gyro_sensor = GyroSensor(4, scheduler=ManualScheduler())
+
+    def measure_then_reset():
+        # the robot turned to 90, and the orientation is reset while that sample is read
+        gyro_sensor.reset_orientation()
+        return 90
+
+    gyro_sensor.get_orientation = measure_then_reset
+    gyro_sensor.update_orientation()
+    assert gyro_sensor.orientation == 0
+
+    gyro_sensor.get_orientation = lambda: 5
+    gyro_sensor.update_orientation()
+    assert gyro_sensor.orientation == 5
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+from mission_plan import ACTIONS, MissionPlan, MissionPlanError
+
+ACTIONS_BY_KIND = {
+    "room": {"delivering": "visit_room", "going_home": "skip"},
+    "home": {"delivering": "skip", "going_home": "enter_home"},
+}
+HANDLERS = {action: (lambda action=action: action) for action in ACTIONS}
+
+
+def test_default_plan_loads():
+    plan = MissionPlan.load()
+    assert len(plan.compile(HANDLERS)) == len(plan.junctions)
+
+
+@pytest.mark.parametrize("junctions, actions, message", [
+    ([], ACTIONS_BY_KIND, "no junctions"),
+    (["room", "hall"], ACTIONS_BY_KIND, "junction 1 is a 'hall'"),
+    (["home"], {"home": {"delivering": "skip"}}, "while going_home"),
+    (["home"], {"home": {"delivering": "fly", "going_home": "enter_home"}}, "unknown action 'fly'"),
+    (["room"], ACTIONS_BY_KIND, "can never get home"),
+])
+def test_invalid_plan_is_rejected(junctions, actions, message):
+    with pytest.raises(MissionPlanError, match=message):
+        MissionPlan(junctions, actions)
+
+
+def test_plan_file_needs_a_known_version(tmp_path):
+    path = tmp_path / "plan.json"
+    path.write_text(json.dumps({"version": 2, "junctions": ["home"], "actions": ACTIONS_BY_KIND}))
+    with pytest.raises(MissionPlanError, match="unsupported plan version 2"):
+        MissionPlan.load(str(path))
+    path.write_text("{")
+    with pytest.raises(MissionPlanError, match="not valid JSON"):
+        MissionPlan.load(str(path))
+
+
+def test_compile_needs_a_handler_for_every_action():
+    plan = MissionPlan(["room", "home"], ACTIONS_BY_KIND)
+    handlers = dict(HANDLERS)
+    del handlers["turn"]
+    with pytest.raises(MissionPlanError, match="no handler for the actions \\['turn'\\]"):
+        plan.compile(handlers)
+
+
+def test_compiled_transitions_follow_the_plan():
+    mission = MissionPlan(["room", "home"], ACTIONS_BY_KIND).compile(HANDLERS)
+    delivering = mission.transition(0, False)
+    assert (delivering.action, delivering.handler(), delivering.next_junction) == ("visit_room", "visit_room", 1)
+    home = mission.transition(1, True)
+    assert (home.action, home.ends_mission) == ("enter_home", True)
+    assert mission.transition(2, False) is None
@@ -8,20 +8,28 @@ Authors: Ryan Au, Younes Boubekeur
 from __future__ import annotations
 
 from typing import Literal, Type
+from concurrent.futures import Future, InvalidStateError
+from array import array
+from bisect import bisect_left
 import math
 import atexit
 import os
 import signal
+import threading
 import time
 import sys
 
+from . import clock
+from .io_scheduler import IOPriority, IOScheduler
+from .trace import METHOD_CODES, TraceReplay, TraceWriter
+
 
 def busy_sleep(seconds: float):
     """A different form of time.sleep, which uses a while loop that 
     constantly checks the time, to see if the duration has elapsed."""
-    start = time.time()
-    while (time.time() - start) < seconds:
-        time.sleep(0.005)
+    start = clock.time()
+    while (clock.time() - start) < seconds:
+        clock.sleep(0.005)
 
 
 class IOError(OSError):
@@ -158,13 +166,95 @@ class Color:
 
 _color_names_by_code = {c.code: c.name for c in ColorMappings._all_mappings}
 
+SENSOR_PORT_NAMES = ('1', '2', '3', '4')
+MOTOR_PORT_NAMES = ('A', 'B', 'C', 'D')
+
+_SENSOR_PORT_BITS = (BrickPi3.PORT_1, BrickPi3.PORT_2, BrickPi3.PORT_3, BrickPi3.PORT_4)
+_SENSOR_PORT_INDEXES = {port: index for index, port in enumerate(_SENSOR_PORT_BITS)}
+_MOTOR_PORT_BITS = (BrickPi3.PORT_A, BrickPi3.PORT_B, BrickPi3.PORT_C, BrickPi3.PORT_D)
+
+# Length of the SPI status request (and reply) of each sensor type. I2C depends on the port.
+_SENSOR_TYPE = BrickPi3.SENSOR_TYPE
+SENSOR_STATUS_REQUEST_LENGTHS = {
+    _SENSOR_TYPE.CUSTOM: 10,
+    _SENSOR_TYPE.TOUCH: 7,
+    _SENSOR_TYPE.NXT_TOUCH: 7,
+    _SENSOR_TYPE.EV3_TOUCH: 7,
+    _SENSOR_TYPE.NXT_ULTRASONIC: 7,
+    _SENSOR_TYPE.EV3_COLOR_REFLECTED: 7,
+    _SENSOR_TYPE.EV3_COLOR_AMBIENT: 7,
+    _SENSOR_TYPE.EV3_COLOR_COLOR: 7,
+    _SENSOR_TYPE.EV3_ULTRASONIC_LISTEN: 7,
+    _SENSOR_TYPE.EV3_INFRARED_PROXIMITY: 7,
+    _SENSOR_TYPE.NXT_COLOR_FULL: 12,
+    _SENSOR_TYPE.NXT_LIGHT_ON: 8,
+    _SENSOR_TYPE.NXT_LIGHT_OFF: 8,
+    _SENSOR_TYPE.NXT_COLOR_RED: 8,
+    _SENSOR_TYPE.NXT_COLOR_GREEN: 8,
+    _SENSOR_TYPE.NXT_COLOR_BLUE: 8,
+    _SENSOR_TYPE.NXT_COLOR_OFF: 8,
+    _SENSOR_TYPE.EV3_GYRO_ABS: 8,
+    _SENSOR_TYPE.EV3_GYRO_DPS: 8,
+    _SENSOR_TYPE.EV3_ULTRASONIC_CM: 8,
+    _SENSOR_TYPE.EV3_ULTRASONIC_INCHES: 8,
+    _SENSOR_TYPE.EV3_COLOR_RAW_REFLECTED: 10,
+    _SENSOR_TYPE.EV3_GYRO_ABS_DPS: 10,
+    _SENSOR_TYPE.EV3_INFRARED_REMOTE: 10,
+    _SENSOR_TYPE.EV3_COLOR_COLOR_COMPONENTS: 14,
+    _SENSOR_TYPE.EV3_INFRARED_SEEK: 14,
+}
+
+
+class BrickSnapshot:
+    """
+    Immutable view of every sensor and motor port, read in a single pass by
+    Brick.read_snapshot().
+
+    timestamp - clock.monotonic() at the start of the pass
+    duration - seconds taken to read all the ports
+    sensor_values - tuple of 4 values for ports 1 to 4. None if the port is not
+        configured or has no valid data. List values are stored as tuples.
+    motor_statuses - tuple of 4 [flags, power, encoder, dps] tuples for ports A to D.
+    """
+    __slots__ = ("timestamp", "duration", "sensor_values", "motor_statuses")
+
+    def __init__(self, timestamp: float, duration: float, sensor_values: tuple, motor_statuses: tuple):
+        object.__setattr__(self, "timestamp", timestamp)
+        object.__setattr__(self, "duration", duration)
+        object.__setattr__(self, "sensor_values", sensor_values)
+        object.__setattr__(self, "motor_statuses", motor_statuses)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("BrickSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("BrickSnapshot is immutable")
+
+    def get_sensor_value(self, port: Literal[1, 2, 3, 4]):
+        "Get the value read on sensor port 1, 2, 3 or 4."
+        return self.sensor_values[SENSOR_PORT_NAMES.index(str(port))]
+
+    def get_motor_status(self, port: Literal["A", "B", "C", "D"]):
+        "Get the (flags, power, encoder, dps) status read on motor port A, B, C or D."
+        return self.motor_statuses[MOTOR_PORT_NAMES.index(str(port).upper())]
+
+    def get_motor_encoder(self, port: Literal["A", "B", "C", "D"]):
+        return self.get_motor_status(port)[2]
+
+    def __repr__(self):
+        sensors = ", ".join([f"{name}={value}" for name, value in zip(SENSOR_PORT_NAMES, self.sensor_values)])
+        motors = ", ".join([f"{name}={value}" for name, value in zip(MOTOR_PORT_NAMES, self.motor_statuses)])
+        return f"BrickSnapshot(t={self.timestamp:.4f}, {sensors}, {motors})"
+
 
 class Brick(BrickPi3):
     """
     Wrapper class for the BrickPi3 class. Comes with additional methods such get_sensor_status.
+
+    io_priority is the IOPriority used for this brick's requests when the I/O scheduler is running.
     """
 
-    def __init__(self, bp=None):
+    def __init__(self, bp=None, io_priority: int = IOPriority.BACKGROUND):
         if bp is None:
             self.bp = BP
         else:
@@ -173,13 +263,48 @@ class Brick(BrickPi3):
         parent = self.bp.__dict__
         for key in parent.keys():
             setattr(self, str(key), child.get(key, parent.get(key)))
+        self.io_priority = io_priority
+        # per sensor port: (sensor type, status request, accepted reply types), see set_sensor_type
+        self._status_layouts = [None, None, None, None]
+        # per sensor port: (sensor type, status), only kept once the sensor has valid data
+        self._status_cache = [None, None, None, None]
 
-    def get_sensor_status(self, port: Literal[1, 2, 4, 8]):
+    def set_sensor_type(self, port, type, params=0):
+        """
+        Set the sensor type of one or more sensor ports, and precompute how their
+        status is requested and decoded by get_sensor_status.
+        """
+        result = super(Brick, self).set_sensor_type(port, type, params)
+        for port_index, port_bit in enumerate(_SENSOR_PORT_BITS):
+            if port & port_bit:
+                self._status_cache[port_index] = None
+                self._status_layouts[port_index] = self._build_status_layout(port_index)
+        return result
+
+    def _build_status_layout(self, port_index: int):
+        sensor_type = self.SensorType[port_index]
+        if sensor_type == self.SENSOR_TYPE.I2C:
+            length = 6 + self.I2CInBytes[port_index]
+        else:
+            length = SENSOR_STATUS_REQUEST_LENGTHS.get(sensor_type)
+            if length is None:
+                return (sensor_type, None, None)
+        message_type = getattr(self.BPSPI_MESSAGE_TYPE, f"GET_SENSOR_{port_index + 1}")
+        request = [self.SPI_Address, message_type] + [0] * (length - 2)
+        if sensor_type == self.SENSOR_TYPE.TOUCH:
+            accepted_types = (self.SENSOR_TYPE.TOUCH, self.SENSOR_TYPE.NXT_TOUCH, self.SENSOR_TYPE.EV3_TOUCH)
+        else:
+            accepted_types = (sensor_type,)
+        return (sensor_type, request, accepted_types)
+
+    def get_sensor_status(self, port: Literal[1, 2, 4, 8], use_cache: bool = True):
         """
         Read a sensor status.
 
         Keyword arguments:
         port - The sensor port (one at a time). PORT_1, PORT_2, PORT_3, or PORT_4.
+        use_cache - If True, a VALID_DATA status is returned without any SPI transaction
+            until the sensor type of the port changes.
 
         Return a code from 0 to 4 with the following meanings:
 
@@ -190,147 +315,317 @@ class Brick(BrickPi3):
         4: I2C_ERROR
         5: INCORRECT_SENSOR_PORT
         """
-        if port == self.PORT_1:
-            message_type = self.BPSPI_MESSAGE_TYPE.GET_SENSOR_1
-            port_index = 0
-        elif port == self.PORT_2:
-            message_type = self.BPSPI_MESSAGE_TYPE.GET_SENSOR_2
-            port_index = 1
-        elif port == self.PORT_3:
-            message_type = self.BPSPI_MESSAGE_TYPE.GET_SENSOR_3
-            port_index = 2
-        elif port == self.PORT_4:
-            message_type = self.BPSPI_MESSAGE_TYPE.GET_SENSOR_4
-            port_index = 3
-        else:
+        port_index = _SENSOR_PORT_INDEXES.get(port)
+        if port_index is None:
             raise IOError(
                 "get_sensor error. Must be one sensor port at a time. PORT_1, PORT_2, PORT_3, or PORT_4.")
 
-        if self.SensorType[port_index] == self.SENSOR_TYPE.CUSTOM:
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.I2C:
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0]
-            for b in range(self.I2CInBytes[port_index]):
-                outArray.append(0)
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif (self.SensorType[port_index] == self.SENSOR_TYPE.TOUCH
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_TOUCH
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_TOUCH
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_ULTRASONIC
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_REFLECTED
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_AMBIENT
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_COLOR
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_LISTEN
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_INFRARED_PROXIMITY):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if (reply[3] == 0xA5):
-                if ((reply[4] == self.SensorType[port_index] or (self.SensorType[port_index] == self.SENSOR_TYPE.TOUCH
-                                                                 and (reply[4] == self.SENSOR_TYPE.NXT_TOUCH or reply[4] == self.SENSOR_TYPE.EV3_TOUCH)))):
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_FULL:
-            outArray = [self.SPI_Address, message_type,
-                        0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif (self.SensorType[port_index] == self.SENSOR_TYPE.NXT_LIGHT_ON
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_LIGHT_OFF
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_RED
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_GREEN
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_BLUE
-              or self.SensorType[port_index] == self.SENSOR_TYPE.NXT_COLOR_OFF
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_ABS
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_DPS
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_CM
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_ULTRASONIC_INCHES):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif (self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_RAW_REFLECTED
-              or self.SensorType[port_index] == self.SENSOR_TYPE.EV3_GYRO_ABS_DPS):
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.EV3_COLOR_COLOR_COMPONENTS:
-            outArray = [self.SPI_Address, message_type,
-                        0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.EV3_INFRARED_SEEK:
-            outArray = [self.SPI_Address, message_type,
-                        0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
-
-        elif self.SensorType[port_index] == self.SENSOR_TYPE.EV3_INFRARED_REMOTE:
-            outArray = [self.SPI_Address, message_type, 0, 0, 0, 0, 0, 0, 0, 0]
-            reply = self.spi_transfer_array(outArray)
-            if reply[3] == 0xA5:
-                if reply[4] == self.SensorType[port_index]:
-                    return reply[5]
-                else:
-                    return SENSOR_STATE.INCORRECT_SENSOR_PORT
-            else:
-                raise IOError("get_sensor error: No SPI response")
+        sensor_type = self.SensorType[port_index]
+        cached = self._status_cache[port_index]
+        if use_cache and cached is not None and cached[0] == sensor_type:
+            return cached[1]
+
+        layout = self._status_layouts[port_index]
+        if layout is None or layout[0] != sensor_type:  # type changed through another Brick
+            layout = self._status_layouts[port_index] = self._build_status_layout(port_index)
+        _, request, accepted_types = layout
+        if request is None:
+            raise IOError(
+                "get_sensor error: Sensor not configured or not supported.")
+
+        reply = self.spi_transfer_array(list(request))
+        if reply[3] != 0xA5:
+            raise IOError("get_sensor error: No SPI response")
+        if reply[4] not in accepted_types:
+            return SENSOR_STATE.INCORRECT_SENSOR_PORT
+        status = reply[5]
+        if status == SENSOR_STATE.VALID_DATA:
+            self._status_cache[port_index] = (sensor_type, status)
+        return status
+
+    def read_snapshot(self) -> BrickSnapshot:
+        """
+        Read all four sensor ports and all four motor statuses in one pass,
+        and return them as an immutable BrickSnapshot.
+
+        Unconfigured sensor ports are skipped (no SPI transaction) and read as None.
+        """
+        start = clock.monotonic()
+        sensor_values = []
+        for port_index, port in enumerate((self.PORT_1, self.PORT_2, self.PORT_3, self.PORT_4)):
+            if self.SensorType[port_index] == self.SENSOR_TYPE.NONE:
+                sensor_values.append(None)
+                continue
+            try:
+                value = self.get_sensor(port)
+            except (SensorError, OSError):
+                value = None
+            sensor_values.append(tuple(value) if isinstance(value, list) else value)
+
+        motor_statuses = []
+        for port in (self.PORT_A, self.PORT_B, self.PORT_C, self.PORT_D):
+            try:
+                motor_statuses.append(tuple(self.get_motor_status(port)))
+            except OSError:
+                motor_statuses.append((None, None, None, None))
+        return BrickSnapshot(start, clock.monotonic() - start, tuple(sensor_values), tuple(motor_statuses))
+
+    def get_motor_statuses(self, *ports) -> list[list]:
+        "Read the status of each of the given motor ports, in one pass. See get_motor_status."
+        return [self.get_motor_status(port) for port in ports]
+
+    def run_transaction(self, func, *args, **kwargs):
+        """
+        Call func(*args, **kwargs), which makes several brick calls, as a single request:
+        while the I/O scheduler is running, no other request is executed in between.
+        """
+        return func(*args, **kwargs)
+
+
+# Brick methods that talk to the hardware. While the I/O scheduler is running,
+# they are executed by the scheduler thread instead of the calling thread.
+_BRICK_IO_METHODS = (
+    "get_sensor", "get_sensor_status", "set_sensor_type", "read_snapshot",
+    "get_motor_status", "get_motor_encoder", "set_motor_power", "set_motor_position",
+    "set_motor_position_relative", "set_motor_position_kp", "set_motor_position_kd",
+    "set_motor_dps", "set_motor_limits", "offset_motor_encoder", "reset_motor_encoder",
+    "get_motor_statuses", "run_transaction",
+)
+
+_IO_SCHEDULER: IOScheduler | None = None
+
+
+_TRACE_RECORDER: TraceWriter | None = None
+_TRACE_REPLAY: TraceReplay | None = None
+
+
+def _perform_io(method, brick, args, kwargs):
+    "Make the hardware call (or replay it from a trace), and record it if a trace is being recorded."
+    name = method.__name__
+    replay = _TRACE_REPLAY
+    if replay is not None and name in METHOD_CODES:
+        return replay.replay(brick, name, args + tuple(kwargs.values()))
+    recorder = _TRACE_RECORDER
+    if recorder is None or name not in METHOD_CODES:
+        return method(brick, *args, **kwargs)
+    try:
+        result = method(brick, *args, **kwargs)
+    except (SensorError, OSError):
+        recorder.record(clock.monotonic(), name, args + tuple(kwargs.values()), error=True)
+        raise
+    recorder.record(clock.monotonic(), name, args + tuple(kwargs.values()), result)
+    return result
+
+
+def _scheduled_io(method):
+    def wrapper(self, *args, **kwargs):
+        scheduler = _IO_SCHEDULER
+        if scheduler is None:
+            return _perform_io(method, self, args, kwargs)
+        return scheduler.call(self.io_priority, _perform_io, method, self, args, kwargs)
+    wrapper.__name__ = method.__name__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+for _name in _BRICK_IO_METHODS:
+    if hasattr(Brick, _name):
+        setattr(Brick, _name, _scheduled_io(getattr(Brick, _name)))
+
+
+def start_io_scheduler() -> IOScheduler:
+    """
+    Start the I/O scheduler thread, which then exclusively owns the brick.
+    Sensors and motors submit their requests to it with the priority of their class
+    (emergency touch sensor and motors first, then gyro, then color, then the rest).
+    """
+    global _IO_SCHEDULER
+    if _IO_SCHEDULER is None:
+        _IO_SCHEDULER = IOScheduler()
+    _IO_SCHEDULER.start()
+    return _IO_SCHEDULER
+
+
+def stop_io_scheduler():
+    "Stop the I/O scheduler. Hardware calls are then made directly by the calling threads."
+    global _IO_SCHEDULER
+    if _IO_SCHEDULER is not None:
+        _IO_SCHEDULER.stop()
+        _IO_SCHEDULER = None
+
+
+def get_io_scheduler() -> IOScheduler | None:
+    return _IO_SCHEDULER
+
+
+def start_recording(path: str) -> TraceWriter:
+    """
+    Record every sensor value, sensor status, motor status and motor command to a
+    binary trace file (see utils.trace), until stop_recording is called.
+    """
+    global _TRACE_RECORDER
+    stop_recording()
+    _TRACE_RECORDER = TraceWriter(path)
+    return _TRACE_RECORDER
+
+
+def stop_recording():
+    global _TRACE_RECORDER
+    recorder = _TRACE_RECORDER
+    _TRACE_RECORDER = None
+    if recorder is not None:
+        recorder.close()
+
+
+def start_replay(path: str) -> TraceReplay:
+    """
+    Replace the brick with a recorded trace: sensor and motor reads return the recorded
+    values in order, and motor commands do nothing, until stop_replay is called.
+    """
+    global _TRACE_REPLAY
+    _TRACE_REPLAY = TraceReplay(path, error_type=SensorError)
+    return _TRACE_REPLAY
+
 
-        raise IOError(
-            "get_sensor error: Sensor not configured or not supported.")
+def stop_replay():
+    global _TRACE_REPLAY
+    _TRACE_REPLAY = None
+
+
+def read_snapshot(bp=None) -> BrickSnapshot:
+    "Read every sensor and motor port of the brick at once. See Brick.read_snapshot."
+    return Brick(bp).read_snapshot()
+
+
+# Upper bounds of the latency histogram buckets, in microseconds. The last bucket has no bound.
+LATENCY_BUCKETS_US = (50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000)
+_LATENCY_BUCKETS_NS = tuple([bound * 1000 for bound in LATENCY_BUCKETS_US])
+_LATENCY_ENABLED = False
+_LATENCY_HISTOGRAMS: dict[tuple[str, int], LatencyHistogram] = {}  # by (method, port)
+_LATENCY_HISTOGRAMS_LOCK = threading.Lock()
+
+
+class LatencyHistogram:
+    """
+    Latency of one method on one port: call count, total and max time, and the
+    number of calls in each of the LATENCY_BUCKETS_US buckets.
+    """
+    __slots__ = ("method", "port", "counts", "total_ns", "max_ns", "lock")
+
+    def __init__(self, method: str, port: str):
+        self.method = method
+        self.port = port  # port name(s), e.g. "3" or "BC"
+        self.counts = array('L', [0] * (len(LATENCY_BUCKETS_US) + 1))
+        self.total_ns = 0
+        self.max_ns = 0
+        self.lock = threading.Lock()  # the same port can be used from several threads
+
+    def add(self, elapsed_ns: int):
+        bucket = bisect_left(_LATENCY_BUCKETS_NS, elapsed_ns)
+        with self.lock:
+            self.counts[bucket] += 1
+            self.total_ns += elapsed_ns
+            if elapsed_ns > self.max_ns:
+                self.max_ns = elapsed_ns
+
+    def reset(self):
+        with self.lock:
+            self.counts = array('L', [0] * (len(LATENCY_BUCKETS_US) + 1))
+            self.total_ns = 0
+            self.max_ns = 0
+
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def __repr__(self):
+        count = self.count()
+        mean = self.total_ns / count / 1000 if count else 0
+        return (f"{self.method} port {self.port}: {count} calls, mean {mean:.0f} us, "
+                f"max {self.max_ns / 1000:.0f} us, buckets {list(self.counts)}")
+
+
+def _timed(method):
+    """
+    Measure the latency of a Sensor or Motor method, by port, while latency
+    histograms are enabled (see enable_latency_histograms). The histograms of an
+    instance are cached on it by method name and port, so a call only does one dict
+    lookup, and a set_port moves the following calls to the histograms of the new port.
+    """
+    name = method.__qualname__
+
+    def wrapper(self, *args, **kwargs):
+        if not _LATENCY_ENABLED:
+            return method(self, *args, **kwargs)
+        start = time.perf_counter_ns()
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            elapsed = time.perf_counter_ns() - start
+            try:
+                histogram = self._latency_histograms[(name, self.port)]
+            except (AttributeError, KeyError):
+                histogram = _latency_histogram(self, name)
+            histogram.add(elapsed)
+    wrapper.__name__ = method.__name__
+    wrapper.__qualname__ = method.__qualname__
+    wrapper.__doc__ = method.__doc__
+    return wrapper
+
+
+def _latency_histogram(instance, name: str) -> LatencyHistogram:
+    "The histogram of method name on the port of instance, created once and cached on it."
+    with _LATENCY_HISTOGRAMS_LOCK:
+        histogram = _LATENCY_HISTOGRAMS.get((name, instance.port))
+        if histogram is None:
+            port_names = SENSOR_PORT_NAMES if isinstance(instance, Sensor) else MOTOR_PORT_NAMES
+            port = "".join([port_names[i] for i in range(4) if instance.port & (1 << i)])
+            histogram = _LATENCY_HISTOGRAMS[(name, instance.port)] = LatencyHistogram(name, port)
+    if "_latency_histograms" not in instance.__dict__:
+        instance._latency_histograms = {}
+    instance._latency_histograms[(name, instance.port)] = histogram
+    return histogram
+
+
+def enable_latency_histograms(dump_at_exit: bool = True):
+    """
+    Start measuring the latency of the sensor and motor hot paths (get_value, get_rgb,
+    get_abs_measure, set_power, get_status, ...). Times are in real time, not utils.clock time.
+    """
+    global _LATENCY_ENABLED
+    if dump_at_exit and not _LATENCY_ENABLED:
+        atexit.register(dump_latency_histograms)
+    _LATENCY_ENABLED = True
+
+
+def disable_latency_histograms():
+    global _LATENCY_ENABLED
+    _LATENCY_ENABLED = False
+
+
+def latency_histograms_enabled() -> bool:
+    return _LATENCY_ENABLED
+
+
+def get_latency_histograms() -> list[LatencyHistogram]:
+    with _LATENCY_HISTOGRAMS_LOCK:
+        histograms = [histogram for histogram in _LATENCY_HISTOGRAMS.values() if histogram.count()]
+    return sorted(histograms, key=lambda histogram: (histogram.method, histogram.port))
+
+
+def reset_latency_histograms():
+    "Zero every histogram. They stay cached on their instances, so they are reset in place."
+    with _LATENCY_HISTOGRAMS_LOCK:
+        for histogram in _LATENCY_HISTOGRAMS.values():
+            histogram.reset()
+
+
+def dump_latency_histograms(file=None):
+    "Print every latency histogram, one per method and port."
+    file = sys.stdout if file is None else file
+    bounds = " ".join([f"<{bound}" for bound in LATENCY_BUCKETS_US]) + " more"
+    print(f"Latency histograms (buckets in us: {bounds})", file=file)
+    for histogram in get_latency_histograms():
+        print(histogram, file=file)
 
 
 class Sensor:
@@ -346,10 +641,11 @@ class Sensor:
         INCORRECT_SENSOR_PORT = "INCORRECT_SENSOR_PORT"
 
     ALL_SENSORS = {key: None for key in '1 2 3 4'.split(' ')}
+    IO_PRIORITY = IOPriority.BACKGROUND
 
     def __init__(self, port: Literal[1, 2, 3, 4], bp=None):
         "Initialize sensor with a given port (1, 2, 3, or 4)."
-        self.brick = Brick(bp=bp)
+        self.brick = Brick(bp=bp, io_priority=self.IO_PRIORITY)
         self.port = PORTS[str(port).upper()]
         Sensor.ALL_SENSORS[str(port)] = self
 
@@ -374,6 +670,7 @@ class Sensor:
         except SensorError as error:
             return error
 
+    @_timed
     def get_value(self):
         "Get the raw sensor value. May return a float, int, list or None if error."
         try:
@@ -388,7 +685,7 @@ class Sensor:
     def wait_ready(self):
         "Wait (pause program) until the sensor is initialized."
         while self.get_status() != Sensor.Status.VALID_DATA:
-            time.sleep(WAIT_READY_INTERVAL)
+            clock.sleep(WAIT_READY_INTERVAL)
 
 
 def wait_ready_sensors(debug=False):
@@ -406,6 +703,7 @@ class TouchSensor(Sensor):
     Basic touch sensor class. There is only one mode.
     Gives values 0 to 1, with 1 meaning the button is being pressed.
     """
+    IO_PRIORITY = IOPriority.EMERGENCY
 
     def __init__(self, port: Literal[1, 2, 3, 4], mode: str = "touch", bp=None):
         """
@@ -447,6 +745,8 @@ class EV3UltrasonicSensor(Sensor):
         IN = "in"
         LISTEN = "listen"
 
+    IO_PRIORITY = IOPriority.BACKGROUND
+
     def __init__(self, port: Literal[1, 2, 3, 4], mode="cm", bp=None):
         super(EV3UltrasonicSensor, self).__init__(port, bp)
         self.set_mode(mode)
@@ -513,6 +813,8 @@ class EV3ColorSensor(Sensor):
         RAW_RED = "rawred"
         ID = "id"
 
+    IO_PRIORITY = IOPriority.COLOR
+
     def __init__(self, port, mode="component", bp=None):
         super(EV3ColorSensor, self).__init__(port, bp)
         self.set_mode(mode)
@@ -558,6 +860,7 @@ class EV3ColorSensor(Sensor):
             self.wait_ready()
         return self.get_value()
 
+    @_timed
     def get_rgb(self) -> list[float]:
         "Return the RGB values from the sensor. This will switch the sensor to component mode."
         if self.mode != self.Mode.COMPONENT:
@@ -588,8 +891,13 @@ class EV3GyroSensor(Sensor):
         DPS = "dps"
         BOTH = "both"
 
+    IO_PRIORITY = IOPriority.GYRO
+
     def __init__(self, port: Literal[1, 2, 3, 4], mode="both", bp=None):
         super(EV3GyroSensor, self).__init__(port, bp)
+        self.abs_offset = 0  # software zero of the absolute angle, see rezero
+        self.last_abs_measure = None
+        self.rezero_pending = False
         self.set_mode(mode)
 
     def set_mode(self, mode: str):
@@ -613,6 +921,10 @@ class EV3GyroSensor(Sensor):
             else:
                 return False
             self.mode = mode.lower()
+            # the sensor restarts its absolute angle from 0 on a mode change
+            self.abs_offset = 0
+            self.last_abs_measure = None
+            self.rezero_pending = False
             return True
         except SensorError as error:
             return error
@@ -620,23 +932,215 @@ class EV3GyroSensor(Sensor):
     def reset_measure(self):
         return self.set_mode(self.mode.lower())
 
+    def rezero(self, angle=None):
+        """
+        Make the current absolute angle the new 0, in software only.
+        The sensor is not reconfigured, so there is no need to wait for it to be ready again.
+        The angle is taken from the last measure read. If there is none yet, the
+        first measure read by get_zeroed_measure becomes the 0.
+        With angle, the 0 moves by angle degrees instead, e.g. the nominal angle of a
+        turn: what the turn missed is kept in the measures, instead of adding up.
+        """
+        if angle is not None:
+            self.abs_offset += angle
+        elif self.last_abs_measure is None:
+            self.rezero_pending = True
+        else:
+            self.abs_offset = self.last_abs_measure
+            self.rezero_pending = False
+
+    @_timed
     def get_abs_measure(self):
         if self.mode != self.Mode.ABS:
             self.set_mode(self.Mode.ABS)
             self.wait_ready()
         return self.get_value()
 
+    @_timed
     def get_dps_measure(self):
         if self.mode != self.Mode.DPS:
             self.set_mode(self.Mode.DPS)
             self.wait_ready()
         return self.get_value()
 
+    @_timed
     def get_both_measure(self):
         if self.mode != self.Mode.BOTH:
             self.set_mode(self.Mode.BOTH)
             self.wait_ready()
-        return self.get_value()
+        value = self.get_value()
+        if value is not None:
+            self.last_abs_measure = value[0]
+        return value
+
+    @_timed
+    def get_zeroed_measure(self):
+        """
+        Return [abs, dps] read in "both" mode, where abs is relative to the last rezero().
+        Returns None if the sensor has no valid data.
+        """
+        value = self.get_both_measure()
+        if value is None:
+            return None
+        if self.rezero_pending:
+            self.rezero()
+        return [value[0] - self.abs_offset, value[1]]
+
+
+MOTOR_KEEP_ALIVE = 1.0  # seconds after which an unchanged motor command is sent again
+
+
+class MotorCommandCache:
+    """
+    Last command written to each motor port, shared by every Motor object, so a command
+    identical to the one the motor is already running is not written to the brick again.
+
+    An unchanged command is still written every keep_alive seconds (never if None), in
+    case the brick lost it.
+    """
+
+    def __init__(self, keep_alive: float | None = MOTOR_KEEP_ALIVE):
+        self.keep_alive = keep_alive
+        self.lock = threading.RLock()
+        self._commands = {}  # port bit: (mode, value, time written)
+        self.sent = 0
+        self.suppressed = 0
+
+    def is_current(self, port: int, mode: str, value) -> bool:
+        "Whether every motor of port already runs this command."
+        now = clock.monotonic()
+        for bit in _MOTOR_PORT_BITS:
+            if port & bit:
+                command = self._commands.get(bit)
+                if command is None or command[0] != mode or command[1] != value:
+                    return False
+                if self.keep_alive is not None and now - command[2] >= self.keep_alive:
+                    return False
+        return True
+
+    def update(self, port: int, mode: str, value):
+        now = clock.monotonic()
+        for bit in _MOTOR_PORT_BITS:
+            if port & bit:
+                self._commands[bit] = (mode, value, now)
+
+    def invalidate(self, port: int = None):
+        "Forget the last command of port (all the ports if None), so the next one is written."
+        with self.lock:
+            if port is None:
+                self._commands.clear()
+                return
+            for bit in _MOTOR_PORT_BITS:
+                if port & bit:
+                    self._commands.pop(bit, None)
+
+    def write(self, port: int, mode: str, value, write, force: bool = False) -> bool:
+        """
+        Call write() to send the command (mode, value) to port, unless the motors already
+        run it. force=True always sends it. Returns whether it was sent.
+        """
+        return bool(self.write_many([(port, mode, value)], lambda commands: write(), force))
+
+    def write_many(self, commands: list[tuple], write, force: bool = False) -> list[tuple]:
+        """
+        Call write(pending) once with the (port, mode, value) commands that the motors
+        do not already run (all of them if force is True). Returns the commands sent.
+
+        The brick calls of write() must not need this cache's lock on another thread,
+        i.e. write() can run a brick transaction but not call Motor methods in it.
+        """
+        with self.lock:
+            pending = [command for command in commands if force or not self.is_current(*command)]
+            self.suppressed += len(commands) - len(pending)
+            if not pending:
+                return pending
+            # forgotten first, so a failed write is not remembered as done
+            for port, _, _ in pending:
+                self.invalidate(port)
+            write(pending)
+            for command in pending:
+                self.update(*command)
+            self.sent += len(pending)
+            return pending
+
+
+_MOTOR_COMMANDS = MotorCommandCache()
+
+MOVE_POSITION_TOLERANCE = 3  # degrees
+MOVE_TIMEOUT = 5.0  # seconds
+
+
+class _MoveWatcher:
+    """
+    Thread that completes the futures returned by Motor.move_to, once their motor is
+    at its target. It only runs while there are moves to watch.
+    """
+    INTERVAL = 0.02  # seconds between two checks
+
+    def __init__(self):
+        self._moves = {}  # motor port: (motor, target, tolerance, deadline, future)
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, motor, target, tolerance, timeout, future):
+        entry = (motor, target, tolerance, clock.monotonic() + timeout, future)
+        with self._lock:
+            previous = self._moves.get(motor.port)
+            self._moves[motor.port] = entry
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="motor-moves", daemon=True)
+                self._thread.start()
+        if previous is not None:
+            _complete(previous[4], False)  # superseded by the new move
+
+    def _run(self):
+        while True:
+            with self._lock:
+                moves = list(self._moves.values())
+                if not moves:
+                    self._thread = None
+                    return
+            for entry in moves:
+                motor, target, tolerance, deadline, future = entry
+                try:
+                    position = motor.get_position()
+                    reached = abs(position - target) <= tolerance and not motor.is_moving()
+                except (OSError, TypeError):
+                    reached = False
+                if reached or clock.monotonic() > deadline:
+                    with self._lock:
+                        if self._moves.get(motor.port) is entry:
+                            del self._moves[motor.port]
+                    _complete(future, reached)
+            clock.sleep(_MoveWatcher.INTERVAL)
+
+
+def _complete(future: Future, result):
+    try:
+        future.set_result(result)
+    except InvalidStateError:
+        pass  # cancelled or already completed
+
+
+_MOVE_WATCHER = _MoveWatcher()
+
+
+def wait_for_move(move: Future, sleep_interval: float = None) -> bool:
+    "Block until the move returned by Motor.move_to is done, and return whether it reached its target."
+    if sleep_interval is None:
+        sleep_interval = WAIT_READY_INTERVAL
+    while not move.done():
+        clock.sleep(sleep_interval)
+    return not move.cancelled() and move.result()
+
+
+def get_motor_command_cache() -> MotorCommandCache:
+    return _MOTOR_COMMANDS
+
+
+def set_motor_keep_alive(seconds: float | None):
+    "Write unchanged motor commands again every given seconds, or never if None."
+    _MOTOR_COMMANDS.keep_alive = seconds
 
 
 class Motor:
@@ -644,6 +1148,7 @@ class Motor:
     INF = INF
     MAX_SPEED = 1560  # positive or negative degree per second speed
     MAX_POWER = 100  # positive or negative percent power
+    IO_PRIORITY = IOPriority.MOTOR
 
     def __init__(self, port: Literal["A", "B", "C", "D"] | list[str], bp=None):
         """
@@ -651,7 +1156,7 @@ class Motor:
         You may also provide a list of these ports such as ["A", "C"] to run
         both motors at the exact same time (exact combined behavior unknown).
         """
-        self.brick = Brick(bp)
+        self.brick = Brick(bp, io_priority=self.IO_PRIORITY)
         self.set_port(port)
 
     def set_port(self, port):
@@ -665,7 +1170,8 @@ class Motor:
         elif isinstance(port, int) or isinstance(port, str):
             self.port = PORTS[str(port).upper()]
 
-    def set_power(self, power):
+    @_timed
+    def set_power(self, power, force=False):
         """
         Commands the motor to rotate continuously. Will rotate at the given power percentage.
         (Constant-Type Motor Control)
@@ -680,12 +1186,17 @@ class Motor:
         IT RESETS any limits defined by 'Motor.set_limits(power, dps)'
         SOLIDLY STOPS the motor if given 'Motor.set_power(0)'
 
+        A power equal to the last one commanded is not written to the brick again
+        (see MotorCommandCache), unless force is True.
+
         Keyword arguments:
         power - The power from -100 to 100, or -128 for float
+        force - Write the command even if the motor already runs it
         """
-        self.brick.set_motor_power(self.port, power)
+        _MOTOR_COMMANDS.write(self.port, "power", power,
+                              lambda: self.brick.set_motor_power(self.port, power), force)
 
-    def float_motor(self):
+    def float_motor(self, force=False):
         """(Float the motor), which unlocks the motor, and allows outside forces to rotate it.
 
         NORMALLY, when powered, the motor will maintain its current position, 
@@ -699,9 +1210,9 @@ class Motor:
         It DOES NOT RESET any limits defined by (Motor.set_limits)
         The Motor will stop any current movements, then unlock
         """
-        self.brick.set_motor_power(self.port, -128)
+        self.set_power(-128, force)
 
-    def set_position(self, position):
+    def set_position(self, position, force=False):
         """
         Command the motor rotate a given number of degrees away from its origin 0.
         (Position-Type Motor Control)
@@ -723,8 +1234,27 @@ class Motor:
         SIDE EFFECTS:
         If you use Motor.set_position IMMEDIATELY AFTER Motor.set_power or Motor.set_dps,
             it will rotate at FULL POWER. This may crash the robot.
+
+        A position equal to the last one commanded is not written to the brick again
+        (see MotorCommandCache), unless force is True. Resetting the encoder clears it.
         """
-        self.brick.set_motor_position(self.port, position)
+        _MOTOR_COMMANDS.write(self.port, "position", position,
+                              lambda: self.brick.set_motor_position(self.port, position), force)
+
+    def move_to(self, position, tolerance=MOVE_POSITION_TOLERANCE, timeout=MOVE_TIMEOUT) -> Future:
+        """
+        Start moving the motor to the position (see set_position) and return at once.
+
+        Returns a concurrent.futures.Future whose result is True once the encoder is within
+        tolerance degrees of the position and the motor has stopped, or False if it is not
+        there after timeout seconds or if another move_to of the motor replaced this one.
+        Use wait_for_move, Future.result or Future.add_done_callback to wait for it.
+        """
+        future = Future()
+        future.set_running_or_notify_cancel()
+        self.set_position(position)
+        _MOVE_WATCHER.watch(self, position, tolerance, timeout, future)
+        return future
 
     def set_position_relative(self, degrees):
         """
@@ -751,6 +1281,8 @@ class Motor:
         If you use Motor.set_position IMMEDIATELY AFTER Motor.set_power or Motor.set_dps,
             it will rotate at FULL POWER. This may crash the robot.
         """
+        # moves the target, so the next absolute position must be written
+        _MOTOR_COMMANDS.invalidate(self.port)
         self.brick.set_motor_position_relative(self.port, degrees)
 
     def set_position_kp(self, kp=25):
@@ -779,7 +1311,7 @@ class Motor:
         """
         self.brick.set_motor_position_kd(self.port, kd)
 
-    def set_dps(self, dps):
+    def set_dps(self, dps, force=False):
         """
         Commands the motor to rotate continuously. Will rotate at the given speed (deg/sec).
         (Constant-Type Motor Control)
@@ -794,10 +1326,13 @@ class Motor:
         SOLIDLY STOPS the motor if given 'Motor.set_dps(0)'
 
         Keyword arguments:
-        dps - The target speed in degrees per second
+        dps - The target speed in degrees per second, not written again if unchanged
+        force - Write the command even if the motor already runs it
         """
-        self.brick.set_motor_dps(self.port, dps)
-        self.set_limits(dps=dps)
+        def write():
+            self.brick.set_motor_dps(self.port, dps)
+            self.set_limits(dps=dps)
+        _MOTOR_COMMANDS.write(self.port, "dps", dps, write, force)
 
     def set_limits(self, power=0, dps=0):
         """
@@ -817,6 +1352,7 @@ class Motor:
         """
         self.brick.set_motor_limits(self.port, power, dps)
 
+    @_timed
     def get_status(self):
         """
         Read a motor status.
@@ -903,6 +1439,7 @@ class Motor:
 
         You can zero the encoder by offsetting it by the current position
         """
+        _MOTOR_COMMANDS.invalidate(self.port)
         self.brick.offset_motor_encoder(self.port, position)
 
     def reset_encoder(self):
@@ -911,6 +1448,7 @@ class Motor:
 
         Keyword arguments:
         """
+        _MOTOR_COMMANDS.invalidate(self.port)
         self.brick.reset_motor_encoder(self.port)
 
     def reset_position(self):
@@ -932,13 +1470,62 @@ class Motor:
         if sleep_interval is None:
             sleep_interval = WAIT_READY_INTERVAL
         while not self.is_moving():
-            time.sleep(sleep_interval)
+            clock.sleep(sleep_interval)
 
     def wait_is_stopped(self, sleep_interval: float = None):
         if sleep_interval is None:
             sleep_interval = WAIT_READY_INTERVAL
         while self.is_moving():
-            time.sleep(sleep_interval)
+            clock.sleep(sleep_interval)
+
+
+class MotorGroup:
+    """
+    Motors commanded together, each with its own value: the commands are written to the
+    brick in one transaction, so the motors never run on a half-applied command, and the
+    statuses are read in one pass. Like Motor, the commands go through the
+    MotorCommandCache and the calls are measured by the latency histograms.
+    """
+    IO_PRIORITY = Motor.IO_PRIORITY
+
+    def __init__(self, *motors: Motor):
+        "The motors must be on the same BrickPi3."
+        bp = motors[0].brick.bp
+        if any([motor.brick.bp is not bp for motor in motors]):
+            raise ValueError("the motors of a MotorGroup must be on the same BrickPi3")
+        self.motors = motors
+        self.port = sum([motor.port for motor in motors])  # all the ports, for the histograms
+        self.brick = Brick(bp, io_priority=self.IO_PRIORITY)
+
+    @_timed
+    def set_power(self, *powers, force=False):
+        "Set the power of each motor, in order (see Motor.set_power)."
+        commands = [(motor.port, "power", power) for motor, power in zip(self.motors, powers)]
+        _MOTOR_COMMANDS.write_many(commands, self._write_power, force)
+
+    @_timed
+    def set_dps(self, *speeds, force=False):
+        "Set the speed of each motor in degrees per second, in order (see Motor.set_dps)."
+        commands = [(motor.port, "dps", dps) for motor, dps in zip(self.motors, speeds)]
+        _MOTOR_COMMANDS.write_many(commands, self._write_dps, force)
+
+    @_timed
+    def get_statuses(self) -> list[list]:
+        "The [flags, power, encoder, dps] status of each motor, in order, read in one pass."
+        return self.brick.get_motor_statuses(*[motor.port for motor in self.motors])
+
+    def _write_power(self, commands):
+        def write():
+            for port, _, power in commands:
+                self.brick.set_motor_power(port, power)
+        self.brick.run_transaction(write)
+
+    def _write_dps(self, commands):
+        def write():
+            for port, _, dps in commands:
+                self.brick.set_motor_dps(port, dps)
+                self.brick.set_motor_limits(port, 0, dps)
+        self.brick.run_transaction(write)
 
 
 def create_motors(motor_ports: list[Literal["A", "B", "C", "D"]] | str):
@@ -999,7 +1586,11 @@ def configure_ports(*,
 
 def reset_brick(*args):
     "Reset BrickPi devices when program exits ('at exit')."
-    BP.reset_all()
+    if _IO_SCHEDULER is not None:
+        _IO_SCHEDULER.call(IOPriority.EMERGENCY, BP.reset_all)
+    else:
+        BP.reset_all()
+    _MOTOR_COMMANDS.invalidate()
 
 
 # Reset brick when the program exits
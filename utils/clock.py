@@ -0,0 +1,187 @@
+"""
+Clock used by the robot and the brick layer for all their timing and waiting.
+
+By default it is the real time. A simulated mission can instead use a VirtualClock,
+which skips ahead whenever every thread is waiting, so it runs faster than real time:
+
+    from utils import clock
+    clock.set_clock(clock.VirtualClock())
+
+Coroutines wait with sleep_async, which keeps the asyncio event loop running.
+"""
+
+import asyncio
+import heapq
+import threading
+import time as _time
+
+
+class RealClock:
+    "The real time, from the time module."
+
+    def time(self) -> float:
+        return _time.time()
+
+    def monotonic(self) -> float:
+        return _time.monotonic()
+
+    def sleep(self, seconds: float):
+        _time.sleep(seconds)
+
+    async def sleep_async(self, seconds: float):
+        await asyncio.sleep(seconds)
+
+    def wait_for(self, condition: threading.Condition, predicate, timeout: float = None) -> bool:
+        return condition.wait_for(predicate, timeout)
+
+
+class VirtualClock:
+    """
+    Simulated time, which only moves forward when threads sleep on it.
+
+    As soon as every thread that uses the clock is sleeping, the time jumps to the
+    earliest wake-up time. Threads that are busy, or blocked on something else than
+    the clock (a lock, a join, ...), hold the time back for at most idle_timeout
+    real seconds.
+
+    A coroutine sleeping with sleep_async counts as a sleeping thread until it resumes,
+    without occupying a thread: the clock wakes it up through its event loop.
+    """
+
+    def __init__(self, start: float = 0.0, idle_timeout: float = 0.002):
+        self._now = start
+        self._epoch = _time.time() - start
+        self._condition = threading.Condition()
+        self._wake_up_times = []  # heap, one entry per sleeping thread
+        self._threads = set()  # threads that used the clock
+        self._timers = {}  # wake-up entry of each sleeping coroutine: (event loop, future), None once woken up
+        self.idle_timeout = idle_timeout
+
+    def time(self) -> float:
+        return self._epoch + self._now
+
+    def monotonic(self) -> float:
+        return self._now
+
+    def sleep(self, seconds: float):
+        with self._condition:
+            self._threads.add(threading.current_thread())
+            wake_up_time = self._now + max(seconds, 0.0)
+            entry = (wake_up_time, id(threading.current_thread()))
+            heapq.heappush(self._wake_up_times, entry)
+            self._condition.notify_all()
+            try:
+                while self._now < wake_up_time:
+                    # a thread that is due to wake up must run before the time moves again
+                    due = self._wake_up_times[0][0] <= self._now
+                    if due or not self._everyone_sleeping():
+                        if self._condition.wait(self.idle_timeout) or due:
+                            continue
+                    self._advance()
+            finally:
+                self._wake_up_times.remove(entry)
+                heapq.heapify(self._wake_up_times)
+
+    async def sleep_async(self, seconds: float):
+        loop = asyncio.get_running_loop()
+        woken = loop.create_future()
+        with self._condition:
+            entry = (self._now + max(seconds, 0.0), id(woken))
+            heapq.heappush(self._wake_up_times, entry)
+            self._timers[entry] = (loop, woken)
+            self._wake_due_timers()
+            self._condition.notify_all()
+        try:
+            # like sleep, but the event loop runs while waiting for the wake-up
+            while not woken.done():
+                await asyncio.wait([woken], timeout=self.idle_timeout)
+                with self._condition:
+                    if self._wake_up_times[0][0] > self._now and self._everyone_sleeping():
+                        self._advance()
+        finally:
+            with self._condition:
+                # the time stays put until the coroutine has resumed
+                del self._timers[entry]
+                self._wake_up_times.remove(entry)
+                heapq.heapify(self._wake_up_times)
+                self._condition.notify_all()
+
+    def wait_for(self, condition: threading.Condition, predicate, timeout: float = None,
+                 poll_interval: float = 0.005) -> bool:
+        """
+        Like condition.wait_for, but sleeps on this clock between checks of predicate,
+        so the time can move forward while waiting.
+        """
+        deadline = None if timeout is None else self._now + timeout
+        while not predicate():
+            remaining = poll_interval if deadline is None else min(poll_interval, deadline - self._now)
+            if remaining <= 0:
+                return predicate()
+            condition.release()
+            try:
+                self.sleep(remaining)
+            finally:
+                condition.acquire()
+        return True
+
+    def _everyone_sleeping(self) -> bool:
+        self._threads = {thread for thread in self._threads if thread.is_alive()}
+        return len(self._wake_up_times) - len(self._timers) >= len(self._threads)
+
+    def _advance(self):
+        self._now = self._wake_up_times[0][0]
+        self._wake_due_timers()
+        self._condition.notify_all()
+
+    def _wake_due_timers(self):
+        for entry, timer in self._timers.items():
+            if timer is not None and entry[0] <= self._now:
+                loop, woken = timer
+                self._timers[entry] = None
+                loop.call_soon_threadsafe(_set_result, woken)
+
+
+def _set_result(future):
+    if not future.done():
+        future.set_result(None)
+
+
+_clock = RealClock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    "Use the given clock (RealClock or VirtualClock) from now on."
+    global _clock
+    _clock = clock
+
+
+def time() -> float:
+    "Seconds since the epoch, like time.time()."
+    return _clock.time()
+
+
+def monotonic() -> float:
+    "Seconds from an arbitrary starting point that never goes back, like time.monotonic()."
+    return _clock.monotonic()
+
+
+def sleep(seconds: float):
+    _clock.sleep(seconds)
+
+
+async def sleep_async(seconds: float):
+    "Coroutine that sleeps seconds of this clock, like asyncio.sleep."
+    await _clock.sleep_async(seconds)
+
+
+def wait_for(condition: threading.Condition, predicate, timeout: float = None) -> bool:
+    """
+    Wait on condition (which the caller holds) until predicate() is true, like
+    condition.wait_for, with the timeout in seconds of this clock. Returns the last
+    result of predicate(), so False on timeout.
+    """
+    return _clock.wait_for(condition, predicate, timeout)
@@ -0,0 +1,611 @@
+"""
+Simulated BrickPi3, used by utils.brick when the brickpi3 module or the BrickPi is missing.
+
+The simulation drives a differential-drive robot (left and right wheel motors) on a 2D
+course map, and synthesises the readings of the sensors from the robot's pose:
+- EV3 gyro: heading and turn rate of the robot (clockwise is positive)
+- EV3 color: RGB of the floor tile under the sensor, which is moved around the robot by an arm motor
+- EV3 ultrasonic: distance to the nearest wall in the direction the sensor is facing
+- touch: pressed with Simulation.press_touch
+Every motor also has an encoder, and obeys the power, dps and position commands.
+
+Units are centimeters, degrees and seconds. World x points east, y points north, and the
+heading is measured counter-clockwise from east.
+"""
+
+from __future__ import annotations
+
+import math
+import random
+import threading
+
+from . import clock
+
+
+class Enumeration(object):
+    "Same as brickpi3.Enumeration: comma separated names, with optional '= value'."
+
+    def __init__(self, names):
+        number = 0
+        for name in names.split('\n'):
+            if name.find(",") >= 0:
+                name = name.replace(" ", "").replace(",", "")
+                if name.find("=") != -1:
+                    number = int(float(name[(name.find("=") + 1):]))
+                    name = name[:name.find("=")]
+                setattr(self, name, number)
+                number = number + 1
+
+
+class FirmwareVersionError(Exception):
+    "Exception raised if the BrickPi3 firmware needs to be updated"
+
+
+class SensorError(Exception):
+    "Exception raised if a sensor is not yet configured when trying to read it with get_sensor"
+
+
+# Raw [R, G, B] component readings of each floor tile, and the EV3 color id of the tile
+FLOOR_COLORS = {
+    'W': ((245, 252, 301), 6),  # white
+    '.': ((209, 213, 260), 6),  # grey
+    'K': ((26, 22, 27), 1),  # black
+    'O': ((184, 84, 31), 7),  # orange
+    'Y': ((209, 172, 42), 4),  # yellow
+    'R': ((137, 20, 25), 5),  # red
+    'G': ((100, 154, 44), 3),  # green
+    'B': ((114, 163, 238), 2),  # blue
+    '#': ((209, 213, 260), 6),  # wall, grey on top
+}
+WALL = '#'
+
+
+class CourseMap:
+    """
+    Floor of the course, as a grid of square cells of one color each (see FLOOR_COLORS).
+    Cells outside of the grid read as the background color.
+    """
+
+    def __init__(self, rows: list[str], cell_size: float = 1.0, origin: tuple = (0.0, 0.0), background: str = 'W'):
+        """
+        rows - one string per row of cells, the first row being the northernmost one
+        cell_size - width of a cell in cm
+        origin - world (x, y) of the south-west corner of the grid
+        """
+        self.rows = [row for row in rows]
+        self.height = len(self.rows)
+        self.width = max([len(row) for row in self.rows]) if self.rows else 0
+        self.cell_size = cell_size
+        self.origin = origin
+        self.background = background
+
+    @classmethod
+    def from_ascii(cls, text: str, cell_size: float = 1.0, origin: tuple = (0.0, 0.0), background: str = 'W'):
+        "Create a map from a block of text, one line per row of cells, north first."
+        rows = [line.strip() for line in text.strip().splitlines()]
+        return cls(rows, cell_size, origin, background)
+
+    def tile_at(self, x: float, y: float) -> str:
+        column = int(math.floor((x - self.origin[0]) / self.cell_size))
+        row = self.height - 1 - int(math.floor((y - self.origin[1]) / self.cell_size))
+        if 0 <= row < self.height and 0 <= column < len(self.rows[row]):
+            return self.rows[row][column]
+        return self.background
+
+    def distance_to_wall(self, x: float, y: float, heading: float, max_distance: float = 255.0) -> float:
+        "Distance from (x, y) to the first wall cell in the direction of heading (radians)."
+        step = self.cell_size / 2
+        dx, dy = math.cos(heading) * step, math.sin(heading) * step
+        distance = 0.0
+        while distance < max_distance:
+            if self.tile_at(x, y) == WALL:
+                return distance
+            x += dx
+            y += dy
+            distance += step
+        return max_distance
+
+    def __repr__(self):
+        return "\n".join(self.rows)
+
+
+class CourseBuilder:
+    """
+    Draws a course map out of rectangles of tiles, in world coordinates (cm).
+    """
+
+    def __init__(self, background: str = 'W'):
+        self.background = background
+        self.rectangles = []
+
+    def fill(self, x0: float, y0: float, x1: float, y1: float, tile: str):
+        "Fill the rectangle between the corners (x0, y0) and (x1, y1). Later rectangles are drawn on top."
+        self.rectangles.append((min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1), tile))
+
+    def build(self, cell_size: float = 1.0, margin: float = 30.0) -> CourseMap:
+        x_min = min([r[0] for r in self.rectangles]) - margin
+        y_min = min([r[1] for r in self.rectangles]) - margin
+        x_max = max([r[2] for r in self.rectangles]) + margin
+        y_max = max([r[3] for r in self.rectangles]) + margin
+        width = int(math.ceil((x_max - x_min) / cell_size))
+        height = int(math.ceil((y_max - y_min) / cell_size))
+        grid = [bytearray(self.background.encode() * width) for _ in range(height)]
+        for x0, y0, x1, y1, tile in self.rectangles:
+            c0 = int(round((x0 - x_min) / cell_size))
+            c1 = int(round((x1 - x_min) / cell_size))
+            r0 = height - int(round((y1 - y_min) / cell_size))
+            r1 = height - int(round((y0 - y_min) / cell_size))
+            for row in range(max(r0, 0), min(r1, height)):
+                grid[row][max(c0, 0):min(c1, width)] = tile.encode() * (min(c1, width) - max(c0, 0))
+        return CourseMap([row.decode() for row in grid], cell_size, (x_min, y_min), self.background)
+
+
+def build_course(junctions: list[str], spacing: float = 120.0, branch_length: float = 45.0,
+                 room_size: float = 45.0) -> CourseMap:
+    """
+    Build a course where the robot starts at (0, 0) facing east, and drives along a hallway
+    that has a path on its right at every junction, every `spacing` cm. Each path is marked
+    by a black line on the right of the hallway, and leads to:
+        "room" - an orange then yellow entrance, and a yellow room with a green sticker
+        "meeting_room" - a red entrance
+        "home_valid" - an orange then blue entrance to home
+        "home_invalid" - a red entrance
+        "turn" - the hallway itself, which continues to the right
+    """
+    course = CourseBuilder()
+    x, y = 0.0, 0.0
+    dx, dy = 1.0, 0.0
+    hallway_width = 30.0
+
+    def rect(along0, along1, right0, right1, tile, ox, oy, fx, fy):
+        # rectangle in the frame of a hallway segment starting at (ox, oy) going towards (fx, fy)
+        rx, ry = fy, -fx
+        xa = ox + fx * along0 + rx * right0
+        ya = oy + fy * along0 + ry * right0
+        xb = ox + fx * along1 + rx * right1
+        yb = oy + fy * along1 + ry * right1
+        course.fill(xa, ya, xb, yb, tile)
+
+    segment_start = (x, y)
+    position = 0.0
+    painted = 0.0  # the hallway of the segment is white up to there: the paths already drawn stay
+    rect(-40, 0, -hallway_width / 2, hallway_width / 2, 'W', x, y, dx, dy)
+    for junction in junctions:
+        position += spacing
+        ox, oy = segment_start
+        rect(painted, position + 20, -hallway_width / 2, hallway_width / 2, 'W', ox, oy, dx, dy)
+        painted = position + 20
+        # black line of the path on the right
+        rect(position - 1.5, position + 1.5, 4, hallway_width / 2, 'K', ox, oy, dx, dy)
+        if junction == "turn":
+            segment_start = (ox + dx * position, oy + dy * position)
+            dx, dy = dy, -dx
+            position = 0.0
+            # the new segment starts past the hallway it turned from, and its black line
+            painted = hallway_width / 2
+            continue
+        entrance = branch_length
+        rect(position - 10, position + 10, hallway_width / 2, entrance, 'W', ox, oy, dx, dy)
+        if junction == "room":
+            rect(position - room_size / 2, position + room_size / 2, entrance, entrance + 3, 'O', ox, oy, dx, dy)
+            rect(position - room_size / 2, position + room_size / 2, entrance + 3, entrance + 3 + room_size,
+                 'Y', ox, oy, dx, dy)
+            rect(position - 4, position + 4, entrance + 18, entrance + 26, 'G', ox, oy, dx, dy)
+        elif junction == "home_valid":
+            rect(position - room_size / 2, position + room_size / 2, entrance, entrance + 3, 'O', ox, oy, dx, dy)
+            rect(position - room_size / 2, position + room_size / 2, entrance + 3, entrance + 3 + room_size,
+                 'B', ox, oy, dx, dy)
+        else:  # meeting_room, home_invalid
+            rect(position - room_size / 2, position + room_size / 2, entrance, entrance + 3, 'R', ox, oy, dx, dy)
+    ox, oy = segment_start
+    rect(painted, position + spacing, -hallway_width / 2, hallway_width / 2, 'W', ox, oy, dx, dy)
+    return course.build()
+
+
+# The junctions of the competition course, in the order the robot meets them (see mission_plan.json)
+DEFAULT_JUNCTIONS = ["room", "home_valid", "turn", "meeting_room", "home_invalid", "turn",
+                     "room", "home_valid", "room", "home_invalid", "turn"]
+
+
+class RobotModel:
+    """
+    Physical layout of the simulated robot.
+    """
+    LEFT_WHEEL_PORT = 'C'
+    RIGHT_WHEEL_PORT = 'B'
+    COLOR_ARM_PORT = 'D'
+    WHEEL_RADIUS = 2.8  # cm
+    TRACK_WIDTH = 12.0  # cm between the wheels
+    DPS_PER_POWER = 10.4  # no-load speed of a motor per percent of power
+    MOTOR_TIME_CONSTANT = 0.05  # s, how fast motors reach the commanded speed
+    # relative strength of each motor for a same power. The right wheel motor (B) is 25%
+    # stronger, so the left wheel gets 25% more power to drive straight (see
+    # Robot.FORWARD_MOVEMENT_POWER_LEFT).
+    MOTOR_GAINS = {'A': 1.0, 'B': 1.25, 'C': 1.0, 'D': 1.0}
+    COLOR_ARM_RADIUS = 9.0  # cm between the center of the robot and the color sensor
+    ULTRASONIC_DIRECTION = -90.0  # degrees from the front of the robot, facing right
+
+
+class _SimMotor:
+    def __init__(self, gain: float):
+        self.gain = gain
+        self.mode = "power"  # power, dps, position or float
+        self.power = 0
+        self.dps = 0
+        self.target = 0.0
+        self.limit_power = 0
+        self.limit_dps = 0
+        self.encoder = 0.0  # raw position, before the offset
+        self.offset = 0.0
+        self.speed = 0.0  # actual dps
+        self.applied_power = 0.0
+
+    def target_speed(self) -> float:
+        if self.mode == "power":
+            return self.power * RobotModel.DPS_PER_POWER * self.gain
+        if self.mode == "dps":
+            return self.dps
+        if self.mode == "position":
+            error = self.target - (self.encoder - self.offset)
+            if abs(error) < 0.5:
+                return 0.0
+            limit = 1560.0
+            if self.limit_power:
+                limit = min(limit, self.limit_power * RobotModel.DPS_PER_POWER * self.gain)
+            if self.limit_dps:
+                limit = min(limit, self.limit_dps)
+            return max(-limit, min(limit, 10.0 * error))
+        return 0.0
+
+    def step(self, dt: float):
+        target = self.target_speed()
+        if self.mode == "float":
+            self.speed -= self.speed * min(1.0, dt / (4 * RobotModel.MOTOR_TIME_CONSTANT))
+        else:
+            self.speed += (target - self.speed) * min(1.0, dt / RobotModel.MOTOR_TIME_CONSTANT)
+        if target == 0 and abs(self.speed) < 1:
+            self.speed = 0.0
+        self.applied_power = target / (RobotModel.DPS_PER_POWER * self.gain)
+        self.encoder += self.speed * dt
+
+
+class Simulation:
+    """
+    State of the simulated world, shared by every BrickPi3 (and Brick) object.
+    The world is advanced lazily, up to the current time, every time it is read or commanded.
+    """
+    STEP = 0.005  # s, integration step
+    CONFIGURATION_DELAY = 0.05  # s, time for a sensor to give valid data after its type is set
+
+    def __init__(self, course: CourseMap = None, pose: tuple = (0.0, 0.0, 0.0), seed: int = 0,
+                 color_noise: float = 3.0, time_function=clock.monotonic):
+        """
+        course - map of the floor. Defaults to build_course(DEFAULT_JUNCTIONS)
+        pose - starting (x, y, heading in degrees) of the robot
+        seed - seed of the random sensor noise, so runs are repeatable
+        time_function - returns the current time in seconds, the utils.clock time by default
+        """
+        self.course = course if course is not None else build_course(DEFAULT_JUNCTIONS)
+        self.x, self.y = pose[0], pose[1]
+        self.heading = math.radians(pose[2])
+        self.turn_rate = 0.0  # rad/s
+        self.random = random.Random(seed)
+        self.color_noise = color_noise
+        self.time_function = time_function
+        self.last_update = time_function()
+        self.lock = threading.RLock()
+        self.motors = {port: _SimMotor(gain) for port, gain in RobotModel.MOTOR_GAINS.items()}
+        self.sensor_ready_at = [0.0, 0.0, 0.0, 0.0]
+        self.touch_pressed = [False, False, False, False]
+        self.gyro_zero = [0.0, 0.0, 0.0, 0.0]  # heading (rad) when each gyro was configured
+
+    def update(self):
+        "Advance the world to the current time."
+        with self.lock:
+            now = self.time_function()
+            remaining = now - self.last_update
+            self.last_update = now
+            while remaining > 1e-9:
+                dt = min(self.STEP, remaining)
+                self._step(dt)
+                remaining -= dt
+            return now
+
+    def _step(self, dt: float):
+        for motor in self.motors.values():
+            motor.step(dt)
+        to_cm = math.pi / 180.0 * RobotModel.WHEEL_RADIUS
+        left = self.motors[RobotModel.LEFT_WHEEL_PORT].speed * to_cm
+        right = self.motors[RobotModel.RIGHT_WHEEL_PORT].speed * to_cm
+        speed = (left + right) / 2
+        self.turn_rate = (right - left) / RobotModel.TRACK_WIDTH
+        heading = self.heading + self.turn_rate * dt / 2
+        self.x += speed * math.cos(heading) * dt
+        self.y += speed * math.sin(heading) * dt
+        self.heading += self.turn_rate * dt
+
+    @property
+    def pose(self) -> tuple:
+        "Current (x, y, heading in degrees) of the robot."
+        with self.lock:
+            self.update()
+            return (self.x, self.y, math.degrees(self.heading))
+
+    def press_touch(self, port_index: int, pressed: bool = True):
+        "Press (or release) the touch sensor on port index 0 to 3."
+        self.touch_pressed[port_index] = pressed
+
+    def color_sensor_position(self) -> tuple:
+        arm = self.motors[RobotModel.COLOR_ARM_PORT]
+        # arm at 0 is the right side of the robot, -90 the front and -180 the left side
+        angle = self.heading + math.radians(-90.0 - (arm.encoder - arm.offset))
+        return (self.x + RobotModel.COLOR_ARM_RADIUS * math.cos(angle),
+                self.y + RobotModel.COLOR_ARM_RADIUS * math.sin(angle))
+
+    def read_rgb(self) -> list:
+        x, y = self.color_sensor_position()
+        rgb, _ = FLOOR_COLORS.get(self.course.tile_at(x, y), FLOOR_COLORS['W'])
+        return [max(0, int(round(c + self.random.gauss(0, self.color_noise)))) for c in rgb]
+
+    def read_color_id(self) -> int:
+        x, y = self.color_sensor_position()
+        return FLOOR_COLORS.get(self.course.tile_at(x, y), FLOOR_COLORS['W'])[1]
+
+    def read_gyro(self, port_index: int) -> tuple:
+        "(absolute angle, rate) in degrees, clockwise positive, as the EV3 gyro reports them."
+        angle = -math.degrees(self.heading - self.gyro_zero[port_index])
+        return (int(round(angle)), int(round(-math.degrees(self.turn_rate))))
+
+    def read_distance(self) -> float:
+        heading = self.heading + math.radians(RobotModel.ULTRASONIC_DIRECTION)
+        return round(self.course.distance_to_wall(self.x, self.y, heading), 1)
+
+
+class BrickPi3(object):
+    """
+    Simulated BrickPi3, with the same interface as brickpi3.BrickPi3.
+    Every instance created without a simulation shares the default one.
+    """
+    PORT_1 = 0x01
+    PORT_2 = 0x02
+    PORT_3 = 0x04
+    PORT_4 = 0x08
+
+    PORT_A = 0x01
+    PORT_B = 0x02
+    PORT_C = 0x04
+    PORT_D = 0x08
+
+    MOTOR_FLOAT = -128
+
+    SENSOR_TYPE = Enumeration("""
+        NONE = 1,
+        I2C,
+        CUSTOM,
+        TOUCH,
+        NXT_TOUCH,
+        EV3_TOUCH,
+        NXT_LIGHT_ON,
+        NXT_LIGHT_OFF,
+        NXT_COLOR_RED,
+        NXT_COLOR_GREEN,
+        NXT_COLOR_BLUE,
+        NXT_COLOR_FULL,
+        NXT_COLOR_OFF,
+        NXT_ULTRASONIC,
+        EV3_GYRO_ABS,
+        EV3_GYRO_DPS,
+        EV3_GYRO_ABS_DPS,
+        EV3_COLOR_REFLECTED,
+        EV3_COLOR_AMBIENT,
+        EV3_COLOR_COLOR,
+        EV3_COLOR_RAW_REFLECTED,
+        EV3_COLOR_COLOR_COMPONENTS,
+        EV3_ULTRASONIC_CM,
+        EV3_ULTRASONIC_INCHES,
+        EV3_ULTRASONIC_LISTEN,
+        EV3_INFRARED_PROXIMITY,
+        EV3_INFRARED_SEEK,
+        EV3_INFRARED_REMOTE,
+    """)
+
+    BPSPI_MESSAGE_TYPE = Enumeration("""
+        NONE,
+        GET_MANUFACTURER,
+        GET_NAME,
+        GET_HARDWARE_VERSION,
+        GET_FIRMWARE_VERSION,
+        GET_ID,
+        SET_LED,
+        GET_VOLTAGE_3V3,
+        GET_VOLTAGE_5V,
+        GET_VOLTAGE_9V,
+        GET_VOLTAGE_VCC,
+        SET_ADDRESS,
+        SET_SENSOR_TYPE,
+        GET_SENSOR_1,
+        GET_SENSOR_2,
+        GET_SENSOR_3,
+        GET_SENSOR_4,
+    """)
+
+    SENSOR_STATE = Enumeration("""
+        VALID_DATA,
+        NOT_CONFIGURED,
+        CONFIGURING,
+        NO_DATA,
+        I2C_ERROR,
+    """)
+
+    _default_simulation = None
+
+    def __init__(self, addr=1, detect=True, simulation: Simulation = None):
+        if simulation is None:
+            if BrickPi3._default_simulation is None:
+                BrickPi3._default_simulation = Simulation()
+            simulation = BrickPi3._default_simulation
+        self.simulation = simulation
+        self.SPI_Address = addr
+        self.SensorType = [self.SENSOR_TYPE.NONE for _ in range(4)]
+        self.I2CInBytes = [0, 0, 0, 0]
+
+    @staticmethod
+    def _sensor_indexes(port):
+        return [index for index in range(4) if port & (1 << index)]
+
+    @staticmethod
+    def _motor_ports(port):
+        return [name for index, name in enumerate("ABCD") if port & (1 << index)]
+
+    def _motors(self, port):
+        return [self.simulation.motors[name] for name in self._motor_ports(port)]
+
+    def spi_transfer_array(self, data_out):
+        "Answers the GET_SENSOR_n status requests used by Brick.get_sensor_status."
+        reply = [0] * len(data_out)
+        message_type = data_out[1]
+        index = message_type - self.BPSPI_MESSAGE_TYPE.GET_SENSOR_1
+        if 0 <= index < 4:
+            now = self.simulation.update()
+            reply[3] = 0xA5
+            reply[4] = self.SensorType[index]
+            if self.SensorType[index] == self.SENSOR_TYPE.NONE:
+                reply[5] = self.SENSOR_STATE.NOT_CONFIGURED
+            elif now < self.simulation.sensor_ready_at[index]:
+                reply[5] = self.SENSOR_STATE.CONFIGURING
+            else:
+                reply[5] = self.SENSOR_STATE.VALID_DATA
+        return reply
+
+    def get_voltage_battery(self):
+        return 9.0
+
+    def set_sensor_type(self, port, type, params=0):
+        simulation = self.simulation
+        with simulation.lock:
+            now = simulation.update()
+            for index in self._sensor_indexes(port):
+                self.SensorType[index] = type
+                simulation.sensor_ready_at[index] = now + Simulation.CONFIGURATION_DELAY
+                if type == self.SENSOR_TYPE.I2C:
+                    self.I2CInBytes[index] = params.get("bytes_in", 0) if isinstance(params, dict) else 0
+                # the EV3 gyro restarts its absolute angle from 0 when configured
+                simulation.gyro_zero[index] = simulation.heading
+
+    def get_sensor(self, port):
+        indexes = self._sensor_indexes(port)
+        if len(indexes) != 1:
+            raise IOError("get_sensor error. Must be one sensor port at a time. PORT_1, PORT_2, PORT_3, or PORT_4.")
+        index = indexes[0]
+        simulation = self.simulation
+        types = self.SENSOR_TYPE
+        with simulation.lock:
+            now = simulation.update()
+            sensor_type = self.SensorType[index]
+            if sensor_type == types.NONE or now < simulation.sensor_ready_at[index]:
+                raise SensorError("get_sensor error: Invalid sensor data")
+            if sensor_type in (types.TOUCH, types.NXT_TOUCH, types.EV3_TOUCH):
+                return 1 if simulation.touch_pressed[index] else 0
+            if sensor_type == types.EV3_COLOR_COLOR_COMPONENTS:
+                return simulation.read_rgb() + [0]
+            if sensor_type == types.EV3_COLOR_RAW_REFLECTED:
+                return [simulation.read_rgb()[0], 0]
+            if sensor_type == types.EV3_COLOR_REFLECTED:
+                return min(100, int(sum(simulation.read_rgb()) / 8))
+            if sensor_type == types.EV3_COLOR_AMBIENT:
+                return 5
+            if sensor_type == types.EV3_COLOR_COLOR:
+                return simulation.read_color_id()
+            if sensor_type in (types.EV3_GYRO_ABS, types.EV3_GYRO_DPS, types.EV3_GYRO_ABS_DPS):
+                angle, rate = simulation.read_gyro(index)
+                if sensor_type == types.EV3_GYRO_ABS:
+                    return angle
+                if sensor_type == types.EV3_GYRO_DPS:
+                    return rate
+                return [angle, rate]
+            if sensor_type == types.EV3_ULTRASONIC_CM:
+                return simulation.read_distance()
+            if sensor_type == types.EV3_ULTRASONIC_INCHES:
+                return round(simulation.read_distance() / 2.54, 1)
+            if sensor_type == types.EV3_ULTRASONIC_LISTEN:
+                return 0
+        raise SensorError("get_sensor error: Sensor type not supported by the simulation")
+
+    def set_motor_power(self, port, power):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                if power == self.MOTOR_FLOAT:
+                    motor.mode = "float"
+                else:
+                    motor.mode = "power"
+                    motor.power = max(-100, min(100, power))
+                    motor.limit_power = motor.limit_dps = 0
+
+    def set_motor_position(self, port, position):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                motor.mode = "position"
+                motor.target = float(position)
+
+    def set_motor_position_relative(self, port, degrees):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                start = motor.target if motor.mode == "position" else motor.encoder - motor.offset
+                motor.mode = "position"
+                motor.target = start + degrees
+
+    def set_motor_position_kp(self, port, kp=25):
+        pass
+
+    def set_motor_position_kd(self, port, kd=70):
+        pass
+
+    def set_motor_dps(self, port, dps):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                motor.mode = "dps"
+                motor.dps = dps
+
+    def set_motor_limits(self, port, power=0, dps=0):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                motor.limit_power = power
+                motor.limit_dps = dps
+
+    def get_motor_status(self, port):
+        motors = self._motors(port)
+        if len(motors) != 1:
+            raise IOError("get_motor_status error. Must be one motor port at a time. PORT_A, PORT_B, PORT_C, or PORT_D.")
+        with self.simulation.lock:
+            self.simulation.update()
+            motor = motors[0]
+            return [0, int(round(motor.applied_power)), int(round(motor.encoder - motor.offset)), int(round(motor.speed))]
+
+    def get_motor_encoder(self, port):
+        return self.get_motor_status(port)[2]
+
+    def offset_motor_encoder(self, port, position):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                motor.offset += position
+
+    def reset_motor_encoder(self, port):
+        with self.simulation.lock:
+            self.simulation.update()
+            for motor in self._motors(port):
+                motor.offset = motor.encoder
+
+    def reset_all(self):
+        with self.simulation.lock:
+            self.simulation.update()
+            for index in range(4):
+                self.SensorType[index] = self.SENSOR_TYPE.NONE
+            for motor in self.simulation.motors.values():
+                motor.mode = "float"
+                motor.limit_power = motor.limit_dps = 0
@@ -0,0 +1,139 @@
+"""
+Timestamped events, and the transition tables that emit them.
+
+A TransitionTable maps a change of state (e.g. of the color under the sensor) to the
+name of an event, with declarative rules. An EventBus publishes the events to the
+EventQueue of every subscriber interested in them: a subscriber only sees the events
+published after it subscribed, so events of a phase of the mission do not leak into
+the next one, and it can block on its single queue instead of polling flags.
+"""
+
+from collections import deque, namedtuple
+import threading
+
+from . import clock
+
+# name of the event, time it happened (clock.monotonic()), and what the publisher adds
+TimestampedEvent = namedtuple("TimestampedEvent", ["name", "timestamp", "data"])
+
+ANY = None  # in a transition rule, matches every state
+
+
+class TransitionTable:
+    """
+    Rules (from_states, to_states, event): the transition from a state in from_states
+    to a state in to_states emits event. The rules are tried in order and the first one
+    that matches wins. Each (previous, current) pair is matched once, then memoized.
+    """
+
+    def __init__(self, rules):
+        self.rules = [(ANY if from_states is ANY else frozenset(from_states),
+                       ANY if to_states is ANY else frozenset(to_states), event)
+                      for from_states, to_states, event in rules]
+        self._events = {}
+
+    def lookup(self, previous, current):
+        "The event emitted by the transition from previous to current, or None."
+        key = (previous, current)
+        try:
+            return self._events[key]
+        except KeyError:
+            pass
+        event = None
+        for from_states, to_states, name in self.rules:
+            if (from_states is ANY or previous in from_states) and (to_states is ANY or current in to_states):
+                event = name
+                break
+        self._events[key] = event
+        return event
+
+
+class EventQueue:
+    """
+    The events a subscriber is interested in, oldest first. When it is full, the oldest
+    event is dropped (and counted) to make room for the new one.
+    """
+
+    def __init__(self, bus, names, size):
+        self.bus = bus
+        self.names = frozenset(names)
+        self.events = deque(maxlen=size)
+        self.dropped = 0
+        self.condition = threading.Condition()
+
+    def put(self, event: TimestampedEvent) -> bool:
+        "Queue the event. Returns whether the oldest event was dropped for it."
+        with self.condition:
+            full = len(self.events) == self.events.maxlen
+            if full:
+                self.dropped += 1
+            self.events.append(event)
+            self.condition.notify_all()
+        return full
+
+    def get(self, timeout: float = None) -> TimestampedEvent:
+        "Remove and return the oldest event, waiting up to timeout seconds for one. None on timeout."
+        with self.condition:
+            if not clock.wait_for(self.condition, lambda: len(self.events) > 0, timeout):
+                return None
+            return self.events.popleft()
+
+    def poll(self) -> TimestampedEvent:
+        "Remove and return the oldest event, or None if there is none."
+        with self.condition:
+            return self.events.popleft() if self.events else None
+
+    def clear(self):
+        with self.condition:
+            self.events.clear()
+
+    def close(self):
+        "Unsubscribe: no more events are queued."
+        self.bus.unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class EventBus:
+    """
+    Publishes timestamped events to the queues of their subscribers, from any thread.
+    Counts the published events, and the events dropped by full queues, closed or not.
+    """
+    QUEUE_SIZE = 16
+
+    def __init__(self):
+        self._queues = []
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, *names: str, size: int = QUEUE_SIZE) -> EventQueue:
+        "Return a new EventQueue of the events with these names, published from now on."
+        queue = EventQueue(self, names, size)
+        with self._lock:
+            self._queues.append(queue)
+        return queue
+
+    def unsubscribe(self, queue: EventQueue):
+        with self._lock:
+            if queue in self._queues:
+                self._queues.remove(queue)
+
+    def publish(self, name: str, timestamp: float = None, data=None) -> TimestampedEvent:
+        "Publish an event that happened at timestamp (default now)."
+        event = TimestampedEvent(name, clock.monotonic() if timestamp is None else timestamp, data)
+        with self._lock:
+            queues = [queue for queue in self._queues if name in queue.names]
+            self.published += 1
+        dropped = sum([queue.put(event) for queue in queues])
+        if dropped:
+            with self._lock:
+                self.dropped += dropped
+        return event
+
+    def report(self) -> str:
+        return f"Events: {self.published} published, {self.dropped} dropped by full queues"
@@ -0,0 +1,153 @@
+"""
+Single-owner I/O scheduler for the BrickPi3.
+
+All hardware requests are executed by one dedicated thread, in priority order,
+so the sensor threads and the control thread never use the SPI bus at the same time.
+Requests with the same priority are executed in the order they were submitted.
+"""
+
+import heapq
+import itertools
+import threading
+import time
+
+
+class IOPriority:
+    """
+    Priorities of the I/O requests, lowest value first.
+    """
+    EMERGENCY = 0
+    MOTOR = 1
+    GYRO = 2
+    COLOR = 3
+    BACKGROUND = 4
+
+    NAMES = ("EMERGENCY", "MOTOR", "GYRO", "COLOR", "BACKGROUND")
+
+
+class IORequest:
+    """
+    A hardware call submitted to the IOScheduler.
+    queue_latency is the time in seconds the request waited before being executed.
+    """
+    __slots__ = ("priority", "func", "args", "kwargs", "submitted_at",
+                 "queue_latency", "result", "error", "done")
+
+    def __init__(self, priority: int, func, args, kwargs):
+        self.priority = priority
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.submitted_at = time.monotonic()
+        self.queue_latency = None
+        self.result = None
+        self.error = None
+        self.done = threading.Event()
+
+    def wait(self):
+        "Block until the request is executed, and return its result or raise its error."
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class IOScheduler:
+    """
+    Owns the brick: every submitted call runs on the scheduler thread.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+        self._running = False
+        # per priority: [request count, total queue latency, max queue latency]
+        self._latency_stats = [[0, 0.0, 0.0] for _ in IOPriority.NAMES]
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="brick-io", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        "Stop the scheduler thread after the pending requests are executed."
+        with self._condition:
+            self._running = False
+            self._condition.notify()
+        if self._thread and self._thread.is_alive() and not self.owns_current_thread():
+            self._thread.join()
+
+    def is_running(self) -> bool:
+        return self._running and self._thread is not None and self._thread.is_alive()
+
+    def owns_current_thread(self) -> bool:
+        return threading.current_thread() is self._thread
+
+    def submit(self, priority: int, func, *args, **kwargs) -> IORequest:
+        """
+        Queue func(*args, **kwargs) to be run on the scheduler thread. Once the scheduler
+        is stopped, nothing would run it anymore, so it is run here, before returning.
+        """
+        request = IORequest(priority, func, args, kwargs)
+        with self._condition:
+            queued = self._running
+            if queued:
+                heapq.heappush(self._queue, (priority, next(self._sequence), request))
+                self._condition.notify()
+        if not queued:
+            self._execute(request)
+        return request
+
+    def call(self, priority: int, func, *args, **kwargs):
+        """
+        Run func(*args, **kwargs) on the scheduler thread and return its result.
+        Runs it directly if called from the scheduler thread or if the scheduler is stopped.
+        """
+        if self.owns_current_thread() or not self.is_running():
+            return func(*args, **kwargs)
+        return self.submit(priority, func, *args, **kwargs).wait()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue and self._running:
+                    self._condition.wait()
+                if not self._queue:
+                    return
+                _, _, request = heapq.heappop(self._queue)
+            self._execute(request)
+
+    def _execute(self, request: IORequest):
+        latency = time.monotonic() - request.submitted_at
+        request.queue_latency = latency
+        stats = self._latency_stats[request.priority]
+        stats[0] += 1
+        stats[1] += latency
+        if latency > stats[2]:
+            stats[2] = latency
+        try:
+            request.result = request.func(*request.args, **request.kwargs)
+        except BaseException as err:
+            request.error = err
+        request.done.set()
+
+    def get_latency_stats(self) -> dict:
+        """
+        Return the queueing latency of the executed requests, by priority name:
+        {name: (request count, mean latency in seconds, max latency in seconds)}
+        """
+        result = {}
+        for name, (count, total, maximum) in zip(IOPriority.NAMES, self._latency_stats):
+            result[name] = (count, total / count if count else 0.0, maximum)
+        return result
+
+    def reset_latency_stats(self):
+        self._latency_stats = [[0, 0.0, 0.0] for _ in IOPriority.NAMES]
+
+    def print_latency_report(self):
+        for name, (count, mean, maximum) in self.get_latency_stats().items():
+            print(f"{name:>10}: {count} requests, mean wait {mean * 1000:.3f} ms, max wait {maximum * 1000:.3f} ms")
@@ -0,0 +1,147 @@
+"""
+Fixed-rate cooperative scheduler: the periodic work of the components (sensor sampling,
+control loops, the emergency button) runs as tasks of a single thread, instead of one
+thread each.
+
+Every task has a rate and a priority. The tasks that are due run one after the other,
+by priority (lowest value first), and the priority defaults to the period of the task,
+so faster tasks go first (rate-monotonic). A task is never interrupted: it should do one
+step of its work and return.
+"""
+
+import sys
+import threading
+
+from . import clock
+
+
+class PeriodicTask:
+    """
+    A function called at a fixed rate by the PeriodicScheduler, with its timing statistics:
+    an overrun is a run that ended after the next release of the task, and the releases
+    missed because of it are counted as skipped.
+    """
+    __slots__ = ("name", "func", "period", "priority", "next_release",
+                 "runs", "overruns", "skipped", "total_time", "max_time", "max_lateness")
+
+    def __init__(self, name: str, func, rate: float, priority: float = None):
+        self.name = name
+        self.func = func
+        self.period = 1 / rate
+        self.priority = self.period if priority is None else priority
+        self.next_release = clock.monotonic()
+        self.runs = 0
+        self.overruns = 0
+        self.skipped = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.max_lateness = 0.0  # time between the release and the start of a run
+
+    def __repr__(self):
+        mean = self.total_time / self.runs if self.runs else 0.0
+        return (f"{self.name} at {1 / self.period:g} Hz: {self.runs} runs, mean {mean * 1000:.3f} ms, "
+                f"max {self.max_time * 1000:.3f} ms, max late {self.max_lateness * 1000:.3f} ms, "
+                f"{self.overruns} overruns, {self.skipped} skipped")
+
+
+class PeriodicScheduler:
+    """
+    Runs the periodic tasks on one thread. Tasks can be added and removed at any time,
+    from any thread, including from a task.
+    """
+    # longest sleep between two checks, so a task added meanwhile starts soon
+    MAX_SLEEP = 0.01
+
+    def __init__(self):
+        self._tasks = {}
+        # held while tasks run, so a removed task is sure not to be running anymore
+        self._run_lock = threading.RLock()
+        self._thread = None
+        self._stop_flag = threading.Event()
+
+    def add_task(self, name: str, func, rate: float, priority: float = None) -> PeriodicTask:
+        """
+        Call func() rate times per second, starting now, until remove_task(name).
+        Tasks with a lower priority value run first; the default is the period.
+        """
+        task = PeriodicTask(name, func, rate, priority)
+        with self._run_lock:
+            self._tasks[name] = task
+        return task
+
+    def remove_task(self, name: str):
+        "Remove the task. Waits for it to finish if it is running on another thread."
+        with self._run_lock:
+            self._tasks.pop(name, None)
+
+    def set_rate(self, name: str, rate: float):
+        """
+        Change the rate of a task, from its next release on (at the latest one new period
+        from now). A default priority follows the new period.
+        """
+        with self._run_lock:
+            task = self._tasks.get(name)
+            if task is None:
+                return
+            if task.priority == task.period:
+                task.priority = 1 / rate
+            task.period = 1 / rate
+            task.next_release = min(task.next_release, clock.monotonic() + task.period)
+
+    def has_task(self, name: str) -> bool:
+        return name in self._tasks
+
+    def get_tasks(self) -> list:
+        return list(self._tasks.values())
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop_flag.clear()
+        self._thread = threading.Thread(target=self._run, name="periodic-tasks", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_flag.set()
+        if self._thread and self._thread.is_alive() and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop_flag.is_set():
+            with self._run_lock:
+                self.run_due_tasks()
+                next_release = min([task.next_release for task in self._tasks.values()], default=float("inf"))
+            clock.sleep(max(0, min(next_release - clock.monotonic(), PeriodicScheduler.MAX_SLEEP)))
+
+    def run_due_tasks(self):
+        "Run once every task that is due, by priority."
+        now = clock.monotonic()
+        due = [task for task in self._tasks.values() if task.next_release <= now]
+        due.sort(key=lambda task: task.priority)
+        for task in due:
+            if self._tasks.get(task.name) is not task:
+                continue  # removed by a task that ran before
+            start = clock.monotonic()
+            task.max_lateness = max(task.max_lateness, start - task.next_release)
+            try:
+                task.func()
+            except Exception as err:
+                print(f"Periodic task {task.name} failed: {err!r}", file=sys.stderr)
+            end = clock.monotonic()
+            task.runs += 1
+            task.total_time += end - start
+            task.max_time = max(task.max_time, end - start)
+            task.next_release += task.period
+            if end > task.next_release:
+                # overran into its next period: run again at once, for the last missed release only
+                missed = int((end - task.next_release) / task.period) + 1
+                task.overruns += 1
+                task.skipped += missed - 1
+                task.next_release += (missed - 1) * task.period
+
+    def print_task_report(self):
+        for task in sorted(self._tasks.values(), key=lambda task: task.priority):
+            print(task)
@@ -0,0 +1,225 @@
+"""
+Binary traces of the brick I/O, to reproduce a run offline.
+
+A trace file is a 16 bytes header followed by fixed-width 48 bytes records, appended
+as the calls happen, so it can be memory-mapped and read by index:
+
+    header: magic (8s), version (H), record size (H), reserved (I)
+    record: timestamp (d), kind (B), method (B), port (B), value count (B), flags (B),
+            padding (3x), 4 values (4d)
+
+Sensor values, sensor statuses and motor statuses are recorded with the values
+returned. Commands are recorded with their arguments.
+"""
+
+from __future__ import annotations
+
+import collections
+import mmap
+import os
+import struct
+import threading
+
+MAGIC = b"BPTRACE1"
+VERSION = 1
+HEADER = struct.Struct("<8sHHI")
+RECORD = struct.Struct("<dBBBBB3x4d")
+MAX_VALUES = 4
+
+
+class RecordKind:
+    SENSOR_VALUE = 0
+    SENSOR_STATUS = 1
+    MOTOR_STATUS = 2
+    MOTOR_ENCODER = 3
+    SENSOR_CONFIG = 4
+    MOTOR_COMMAND = 5
+
+
+class RecordFlag:
+    ERROR = 1  # the call raised an error
+    LIST = 2  # the values were returned as a list
+    INTEGERS = 4  # the values were all integers
+    NONE = 8  # the call returned None
+
+
+# Brick methods that are traced, by method code (their index)
+TRACED_METHODS = (
+    "get_sensor", "get_sensor_status", "get_motor_status", "get_motor_encoder",
+    "set_sensor_type", "set_motor_power", "set_motor_position", "set_motor_position_relative",
+    "set_motor_position_kp", "set_motor_position_kd", "set_motor_dps", "set_motor_limits",
+    "offset_motor_encoder", "reset_motor_encoder",
+)
+METHOD_CODES = {name: code for code, name in enumerate(TRACED_METHODS)}
+METHOD_KINDS = {
+    "get_sensor": RecordKind.SENSOR_VALUE,
+    "get_sensor_status": RecordKind.SENSOR_STATUS,
+    "get_motor_status": RecordKind.MOTOR_STATUS,
+    "get_motor_encoder": RecordKind.MOTOR_ENCODER,
+    "set_sensor_type": RecordKind.SENSOR_CONFIG,
+}
+READ_KINDS = (RecordKind.SENSOR_VALUE, RecordKind.SENSOR_STATUS,
+              RecordKind.MOTOR_STATUS, RecordKind.MOTOR_ENCODER)
+
+
+class TraceRecord:
+    "One decoded record of a trace."
+    __slots__ = ("timestamp", "kind", "method", "port", "flags", "values")
+
+    def __init__(self, timestamp, kind, method, port, flags, values):
+        self.timestamp = timestamp
+        self.kind = kind
+        self.method = method
+        self.port = port
+        self.flags = flags
+        self.values = values
+
+    def value(self):
+        "The value as it was returned by the brick: None, a number or a list."
+        if self.flags & RecordFlag.NONE:
+            return None
+        values = [int(v) for v in self.values] if self.flags & RecordFlag.INTEGERS else list(self.values)
+        if self.flags & RecordFlag.LIST:
+            return values
+        return values[0]
+
+    def __repr__(self):
+        return (f"TraceRecord(t={self.timestamp:.4f}, {TRACED_METHODS[self.method]}, "
+                f"port={self.port}, flags={self.flags}, values={self.values})")
+
+
+def _encode(value):
+    "Return (flags, values) for a returned value or a list of arguments."
+    if value is None:
+        return RecordFlag.NONE, ()
+    flags = 0
+    if isinstance(value, (list, tuple)):
+        flags |= RecordFlag.LIST
+        values = tuple(value[:MAX_VALUES])
+    else:
+        values = (value,)
+    values = tuple(v if isinstance(v, (int, float)) else 0 for v in values)
+    if all(isinstance(v, int) for v in values):
+        flags |= RecordFlag.INTEGERS
+    return flags, values
+
+
+class TraceWriter:
+    """
+    Appends records to a trace file. Every record is written straight to the file,
+    so the trace survives the program being killed (e.g. by the emergency stop).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = open(path, "wb", buffering=0)
+        self._file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+        self.record_count = 0
+
+    def record(self, timestamp: float, method: str, args: tuple, result=None, error: bool = False):
+        "Record a call of the given brick method, with its arguments and result."
+        port = args[0] if args else 0
+        kind = METHOD_KINDS.get(method, RecordKind.MOTOR_COMMAND)
+        if kind in READ_KINDS:
+            flags, values = _encode(result)
+        else:
+            flags, values = _encode(list(args[1:]))
+        if error:
+            flags = RecordFlag.ERROR
+            values = ()
+        padded = values + (0.0,) * (MAX_VALUES - len(values))
+        data = RECORD.pack(timestamp, kind, METHOD_CODES[method], port, len(values), flags, *padded)
+        with self._lock:
+            if self._file is not None:
+                self._file.write(data)
+                self.record_count += 1
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class TraceReader:
+    """
+    Memory-mapped, random access reader of a trace file.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as file:
+            size = os.fstat(file.fileno()).st_size
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+        if len(self._map) < HEADER.size:
+            raise ValueError(f"{path} is not a brick trace")
+        magic, version, record_size, _ = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or record_size != RECORD.size:
+            raise ValueError(f"{path} is not a version {VERSION} brick trace")
+        # a record cut short by the end of the program is ignored
+        self._count = (len(self._map) - HEADER.size) // RECORD.size
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, index: int) -> TraceRecord:
+        if index < 0:
+            index += self._count
+        if not 0 <= index < self._count:
+            raise IndexError("trace record index out of range")
+        timestamp, kind, method, port, count, flags, *values = RECORD.unpack_from(
+            self._map, HEADER.size + index * RECORD.size)
+        return TraceRecord(timestamp, kind, method, port, flags, tuple(values[:count]))
+
+    def __iter__(self):
+        for index in range(self._count):
+            yield self[index]
+
+    def close(self):
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+
+
+class TraceExhaustedError(EOFError):
+    "Raised when a replayed program reads more than what was recorded."
+
+
+class TraceReplay:
+    """
+    Plays back a trace: every read of a (method, port) returns the next value recorded
+    for it, in order, and commands are accepted without doing anything.
+    """
+
+    def __init__(self, path: str, error_type=OSError):
+        """
+        error_type is the exception raised for the calls that failed when recorded.
+        """
+        self.reader = TraceReader(path)
+        self.error_type = error_type
+        self._queues = collections.defaultdict(collections.deque)
+        for index, record in enumerate(self.reader):
+            if record.kind in READ_KINDS:
+                self._queues[(record.method, record.port)].append(index)
+
+    def replay(self, brick, method: str, args: tuple):
+        "Return what the brick returned for this call when recorded."
+        kind = METHOD_KINDS.get(method, RecordKind.MOTOR_COMMAND)
+        if kind not in READ_KINDS:
+            if kind == RecordKind.SENSOR_CONFIG:
+                # keep track of the sensor types like the brick does
+                for port_index in range(4):
+                    if args[0] & (1 << port_index):
+                        brick.SensorType[port_index] = args[1]
+            return None
+        queue = self._queues.get((METHOD_CODES[method], args[0]))
+        if not queue:
+            raise TraceExhaustedError(f"no more recorded {method} for port {args[0]}")
+        record = self.reader[queue.popleft()]
+        if record.flags & RecordFlag.ERROR:
+            raise self.error_type(f"{method} failed when recorded")
+        return record.value()
+
+    def remaining(self) -> int:
+        "Number of recorded reads not replayed yet."
+        return sum([len(queue) for queue in self._queues.values()])